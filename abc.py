@@ -1,7 +1,9 @@
-import struct
 import moderngl
 import numpy as np
 
+from cubes import box_coords
+from readback import read_buffer
+
 ctx = moderngl.create_context(standalone=True)
 
 program = ctx.program(
@@ -10,39 +12,63 @@ program = ctx.program(
 
     in vec3 in_vert;
 
-    out vec3 input;
+    out vec3 vert;
+
+    out float sum;
+
+    void main() {
+        vert = in_vert;
+        // pow() is undefined for negative bases
+        sum = vert.x * vert.x * vert.x + vert.y * vert.y * vert.y + vert.z * vert.z * vert.z;
+        if (sum < 0 || sum > 10) sum = -1;
+    }
+    """,
+    # Only the matches are emitted, so the buffer holds nothing but hits
+    geometry_shader="""
+    #version 330
+
+    layout(points) in;
+    layout(points, max_vertices = 1) out;
+
+    in vec3 vert[];
+    in float sum[];
+
+    // `input` is a reserved word in GLSL
+    out vec3 expression;
 
     out float result;
 
     void main() {
-        input = in_vert;
-        result = pow(input.x, 3) + pow(input.y, 3) + pow(input.z, 3);
-        if (result < 0 || result > 10) result = -1;
+        if (sum[0] == -1) return;
+        expression = vert[0];
+        result = sum[0];
+        EmitVertex();
+        EndPrimitive();
     }
     """,
-    varyings=["input", "result"],
+    varyings=["expression", "result"],
 )
 
-verts = []
-size = 10
-for a in range(-size, size + 1):
-    for b in range(-size, size + 1):
-        for c in range(-size, size + 1):
-            verts.append(a)
-            verts.append(b)
-            verts.append(c)
+# Every point of the box, generated by NumPy in the order of cubes.index_to_coord
+verts = box_coords((-10, 10), (-10, 10), (-10, 10), dtype='f4')
 
-vbo = ctx.buffer(np.array(verts, dtype='f4'))
+vbo = ctx.buffer(verts)
 
 vao = ctx.vertex_array(program, vbo, 'in_vert')
 
 buffer = ctx.buffer(reserve=vbo.size * 4 // 3)
 
-vao.transform(buffer)
+query = ctx.query(primitives=True)
+
+with query:
+    vao.transform(buffer, mode=moderngl.POINTS)
+
+hits = query.primitives
+
+# One record per hit, laid out like the captured varyings
+hit_dtype = np.dtype([("expression", "f4", 3), ("result", "f4")])
 
-data = struct.unpack(str(vbo.size * 4 // 12) + 'f', buffer.read())
+data = read_buffer(buffer, hit_dtype, hits)
 
-for i in range(0, len(data), 4):
-    expression, value = data[i : i + 3], data[i + 3]
-    if value == -1: continue
-    print(expression, value)
\ No newline at end of file
+for expression, value in zip(data["expression"].tolist(), data["result"].tolist()):
+    print(tuple(expression), value)
\ No newline at end of file
@@ -1,31 +1,270 @@
+import math
 import numpy as np
-from vector import Vector
-from math import floor
+
+# Named distributions spawn_agents can draw agents from
+SPAWNS = ('uniform', 'disk', 'ring', 'center-facing')
+
+def spawn_agents(count, bounds, distribution='center-facing', rng=None):
+    '''
+    returns a flat float32 array of x, y, angle for count agents inside
+    bounds, an (x min, y min, x max, y max) box, drawn from one call to rng
+    (a seed or a numpy Generator):
+
+    - uniform: anywhere in the bounds, facing any way
+    - disk: within a disk a third the size of the bounds around their center,
+      facing any way
+    - ring: on the edge of that disk, facing any way
+    - center-facing: within that disk, facing its center
+    '''
+    if distribution not in SPAWNS:
+        raise ValueError(f'unknown distribution {distribution!r}, expected one of {SPAWNS}')
+    rng = np.random.default_rng(rng)
+    x0, y0, x1, y1 = bounds
+    u = rng.random((3, count), dtype=np.float32)
+    turn = np.float32(2 * math.pi)
+
+    agents = np.empty((count, 3), dtype='f4')
+    if distribution == 'uniform':
+        agents[:, 0] = x0 + u[0] * np.float32(x1 - x0)
+        agents[:, 1] = y0 + u[1] * np.float32(y1 - y0)
+        agents[:, 2] = u[2] * turn
+    else:
+        radius = np.float32(min(x1 - x0, y1 - y0) / 3)
+        a = u[0] * turn
+        r = radius if distribution == 'ring' else u[1] * radius
+        agents[:, 0] = np.float32((x0 + x1) / 2) + r * np.cos(a)
+        agents[:, 1] = np.float32((y0 + y1) / 2) + r * np.sin(a)
+        agents[:, 2] = a + np.float32(math.pi) if distribution == 'center-facing' else u[2] * turn
+    return agents.ravel()
+
+# The 12 byte x, y, angle record of an f4 agent, as the agent buffers on
+# the GPU and the NumPy backends hold it
+AGENT_DTYPE = np.dtype([('x', 'f4'), ('y', 'f4'), ('angle', 'f4')])
+
+# Layouts agents can be stored in on the GPU, named after the bits of the
+# position: the GLSL type of one agent, its vertex format, its size in bytes
+# and the bits of its position and angle
+AGENT_FORMATS = {
+    'f4': ('vec3', '3f', 12, 32, 32),
+    # x, y as normalized u16 in one word, the angle as u16 in the next
+    'u16': ('uvec2', '2u', 8, 16, 16),
+    # x, y as normalized u12 and the angle as u8 in a single word
+    'u12': ('uint', 'u', 4, 12, 8),
+}
+
+def _quantize(agents, agent_format, bounds):
+    _, _, _, pos_bits, angle_bits = AGENT_FORMATS[agent_format]
+    agents = np.asarray(agents, dtype='f4').reshape(-1, 3)
+    lo = np.array(bounds[:2], dtype='f4')
+    hi = np.array(bounds[2:], dtype='f4')
+    pos = np.rint(np.clip((agents[:, :2] - lo) / (hi - lo), 0, 1) * np.float32(2 ** pos_bits - 1)).astype('u4')
+    turns = agents[:, 2] / np.float32(2 * math.pi)
+    angle = np.rint((turns - np.floor(turns)) * np.float32(2 ** angle_bits)).astype('u4') % (2 ** angle_bits)
+    return pos, angle
+
+def pack_agents(agents, agent_format, bounds):
+    '''
+    returns flat x, y, angle agents packed into one of the AGENT_FORMATS,
+    their positions normalized to bounds, an (x min, y min, x max, y max) box
+    '''
+    if agent_format == 'f4':
+        return np.asarray(agents, dtype='f4').ravel()
+    pos, angle = _quantize(agents, agent_format, bounds)
+    if agent_format == 'u16':
+        return np.stack([pos[:, 0] | pos[:, 1] << 16, angle], axis=1).ravel()
+    return pos[:, 0] | pos[:, 1] << 12 | angle << 24
+
+def unpack_agents(data, agent_format, bounds):
+    '''
+    returns agents packed by pack_agents as a (count, 3) float32 array of
+    x, y, angle, decoded the same way the shaders decode them
+    '''
+    if agent_format == 'f4':
+        return np.asarray(data, dtype='f4').reshape(-1, 3)
+    _, _, _, pos_bits, angle_bits = AGENT_FORMATS[agent_format]
+    data = np.asarray(data, dtype='u4')
+    if agent_format == 'u16':
+        data = data.reshape(-1, 2)
+        x, y, angle = data[:, 0] & 0xFFFF, data[:, 0] >> 16, data[:, 1]
+    else:
+        x, y, angle = data & 0xFFF, data >> 12 & 0xFFF, data >> 24
+    lo = np.array(bounds[:2], dtype='f4')
+    hi = np.array(bounds[2:], dtype='f4')
+    agents = np.empty((len(data), 3), dtype='f4')
+    agents[:, :2] = lo + np.stack([x, y], axis=1).astype('f4') / np.float32(2 ** pos_bits - 1) * (hi - lo)
+    agents[:, 2] = angle.astype('f4') / np.float32(2 ** angle_bits) * np.float32(2 * math.pi)
+    return agents
+
+def agent_codec(agent_format):
+    '''
+    returns GLSL that defines AGENT as the type of one agent in agent_format,
+    with vec3 decode_agent(AGENT) and AGENT encode_agent(vec3) converting it
+    from and to x, y, angle. Packed formats normalize positions to the
+    uniform vec4 agent_bounds.
+    '''
+    glsl_type, _, _, pos_bits, angle_bits = AGENT_FORMATS[agent_format]
+    if agent_format == 'f4':
+        return '''
+    #define AGENT vec3
+
+    vec3 decode_agent(vec3 agent) {
+        return agent;
+    }
+
+    vec3 encode_agent(vec3 agent) {
+        return agent;
+    }
+'''
+    if agent_format == 'u16':
+        unpack = 'uvec3(agent.x & 0xFFFFu, agent.x >> 16, agent.y)'
+        pack = 'uvec2(q.x | q.y << 16, q.z)'
+    else:
+        unpack = 'uvec3(agent & 0xFFFu, agent >> 12 & 0xFFFu, agent >> 24)'
+        pack = 'q.x | q.y << 12 | q.z << 24'
+    return f'''
+    #define AGENT {glsl_type}
+
+    // x min, y min, x max, y max of the packed positions
+    uniform vec4 agent_bounds;
+
+    vec3 decode_agent(AGENT agent) {{
+        vec3 q = vec3({unpack});
+        vec2 pos = agent_bounds.xy + q.xy / {2 ** pos_bits - 1}.0 * (agent_bounds.zw - agent_bounds.xy);
+        return vec3(pos, q.z / {2 ** angle_bits}.0 * 6.28318531);
+    }}
+
+    AGENT encode_agent(vec3 agent) {{
+        vec2 pos = clamp((agent.xy - agent_bounds.xy) / (agent_bounds.zw - agent_bounds.xy), 0.0, 1.0);
+        float turns = fract(agent.z / 6.28318531);
+        uvec3 q = uvec3(round(vec3(pos * {2 ** pos_bits - 1}.0, turns * {2 ** angle_bits}.0)));
+        q.z &= {2 ** angle_bits - 1}u;
+        return {pack};
+    }}
+'''
 
 def pixels_from_agents(width, height, agents):
-    pixels = [0.0] * width * height
-    for agent in agents:
-        pos = agent.pos
-        index = floor(pos.y) * width + floor(pos.x)
-        pixels[int(index)] = 1.00001
-    return np.array(pixels).astype('f4')
+    '''
+    returns a flat float32 image with the cell under every agent in an
+    AgentStore set just above 1
+    '''
+    pixels = np.zeros(width * height, dtype='f4')
+    index = np.floor(agents.y).astype(int) * width + np.floor(agents.x).astype(int)
+    pixels[index] = 1.00001
+    return pixels
 
 def agents_to_array(agents):
-    result = []
-    for agent in agents:
-        result.append(agent.pos.x)
-        result.append(agent.pos.y)
-        result.append(agent.angle)
-    return result
+    '''
+    returns the x, y, angle of an AgentStore interleaved into one flat
+    float32 array, the vertex layout the shaders read
+    '''
+    return agents.interleaved().ravel()
 
 def update_agents(agents, data):
-    for i in range(0, len(data), 3):
-        pos_x = data[i]
-        pos_y = data[i + 1]
-        angle = data[i + 2]
-        
-        agents[i // 3].pos = Vector(pos_x, pos_y)
-        agents[i // 3].angle = angle
+    '''
+    copies interleaved x, y, angle data, as read back from a transform
+    feedback buffer either as an array or as the bytes of buffer.read(),
+    into an AgentStore
+    '''
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = np.frombuffer(data, dtype='f4')
+    data = np.asarray(data, dtype='f4').reshape(-1, 3)
+    for index, name in enumerate(('x', 'y', 'angle')):
+        agents.data[name] = data[:, index]
+
+class AgentStore:
+    '''
+    Agents stored as one contiguous array of AGENT_DTYPE records, extended
+    with the optional species and color fields, the same interleaved layout
+    as the agent buffers of the sims. x, y, angle and the other fields are
+    strided views into it. The whole block can be handed to ctx.buffer and
+    read back with buffer.read_into without copying: a plain store matches
+    the buffers of PhysarumSim with f4 agents, one with species matches
+    those of SpeciesPhysarumSim.
+    '''
+
+    def __init__(self, count, species=False, color=False):
+        self.fields = list(AGENT_DTYPE.names)
+        if species:
+            self.fields.append('species')
+        if color:
+            self.fields += ['r', 'g', 'b']
+        self.data = np.zeros(count, dtype=[(name, 'f4') for name in self.fields])
+
+    @classmethod
+    def from_interleaved(cls, data, **kwargs):
+        '''
+        returns a store holding the agents of a flat x, y, angle array
+        '''
+        data = np.asarray(data, dtype='f4').reshape(-1, 3)
+        store = cls(len(data), **kwargs)
+        update_agents(store, data)
+        return store
+
+    @classmethod
+    def from_agents(cls, agents, **kwargs):
+        '''
+        returns a store holding a list of Agent objects
+        '''
+        return cls.from_interleaved([(a.pos.x, a.pos.y, a.angle) for a in agents], **kwargs)
+
+    def __len__(self):
+        return len(self.data)
+
+    def field(self, name):
+        '''
+        returns the view of one field
+        '''
+        if name not in self.fields:
+            raise KeyError(f'agent store has no {name!r} field')
+        return self.data[name]
+
+    @property
+    def x(self):
+        return self.data['x']
+
+    @property
+    def y(self):
+        return self.data['y']
+
+    @property
+    def angle(self):
+        return self.data['angle']
+
+    @property
+    def species(self):
+        return self.field('species')
+
+    @property
+    def color(self):
+        '''
+        returns the (count, 3) r, g, b view
+        '''
+        if 'r' not in self.fields:
+            raise KeyError('agent store has no color fields')
+        start = self.fields.index('r')
+        return self.data.view('f4').reshape(len(self), -1)[:, start:start + 3]
+
+    def interleaved(self, fields=('x', 'y', 'angle')):
+        '''
+        returns a (count, len(fields)) float32 array with the fields side by
+        side, a view when they are all the fields of the store in order
+        '''
+        if list(fields) == self.fields:
+            return self.data.view('f4').reshape(len(self), -1)
+        return np.stack([self.field(name) for name in fields], axis=1)
+
+    def read_from(self, buffer):
+        '''
+        reads a buffer written in this store's layout straight into the
+        store's memory
+        '''
+        buffer.read_into(self.data)
+
+    def write_to(self, buffer):
+        '''
+        writes the store into a buffer
+        '''
+        buffer.write(self.data)
 
 class Agent:
     def __init__(self, size, pos, angle):
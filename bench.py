@@ -0,0 +1,296 @@
+import json
+import os
+import platform
+import time
+
+import moderngl
+import numpy as np
+
+# Workloads per suite size
+SIZES = {
+    'small': {
+        'physarum': [((256, 256), 10_000), ((512, 512), 100_000)],
+        'particles': [100_000, 1_000_000],
+        'cubes': [50, 100],
+        'helpers': [100_000, 1_000_000],
+        'formats': [((512, 512), 100_000)],
+    },
+    'large': {
+        'physarum': [((1024, 1024), 1_000_000), ((2048, 2048), 4_000_000)],
+        'particles': [1_000_000, 10_000_000],
+        'cubes': [200, 400],
+        'helpers': [1_000_000, 10_000_000],
+        'formats': [((2048, 2048), 4_000_000)],
+    },
+}
+
+# Trail dtype and agent format pairs of the formats suite, the f4 reference first
+FORMATS = [(trail_dtype, agent_format) for trail_dtype in ('f4', 'f2') for agent_format in ('f4', 'u16', 'u12')]
+
+# Steps every format runs before its trail is compared with the reference
+ACCURACY_STEPS = 200
+
+
+def measure(fn, min_time=0.5, sync=None):
+    '''
+    returns the mean seconds per call of fn after a warm-up call, doubling
+    the number of calls until they take at least min_time. sync is called
+    before the clock stops, to wait for queued GPU work.
+    '''
+    fn()
+    if sync is not None:
+        sync()
+    calls = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(calls):
+            fn()
+        if sync is not None:
+            sync()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls
+        calls *= 2
+
+
+def _result(name, params, seconds, **per_call):
+    '''
+    returns one benchmark result, turning the work done per call into rates
+    '''
+    return {
+        'name': name,
+        'params': params,
+        'seconds': seconds,
+        'rates': {unit: amount / seconds for unit, amount in per_call.items()},
+    }
+
+
+def bench_physarum(ctx, sizes, min_time):
+    from physarum import create_sim
+
+    backends = ['transform', 'cpu']
+    if ctx.version_code >= 430:
+        backends.insert(1, 'compute')
+    if os.cpu_count() > 1:
+        backends.append('multiprocess')
+
+    for size, agents in sizes:
+        for backend in backends:
+            sim = create_sim(size, agents, ctx=ctx, backend=backend, seed=0)
+            seconds = measure(sim.step, min_time, ctx.finish)
+            if backend == 'multiprocess':
+                sim.close()
+            yield _result(
+                f'physarum/{backend}/{size[0]}x{size[1]}/{agents}',
+                {'backend': backend, 'size': list(size), 'agents': agents},
+                seconds,
+                **{'steps/s': 1, 'agent_steps/s': agents, 'cells/s': size[0] * size[1]},
+            )
+
+
+def bench_particles(ctx, sizes, min_time):
+    from particles import ParticleSim
+
+    fbo = ctx.simple_framebuffer((1, 1))
+    for agents in sizes:
+        sim = ParticleSim(agents, ctx=ctx, seed=0)
+        fbo.use()
+        seconds = measure(sim.step, min_time, ctx.finish)
+        yield _result(
+            f'particles/{agents}',
+            {'agents': agents},
+            seconds,
+            **{'steps/s': 1, 'agent_steps/s': agents},
+        )
+    fbo.release()
+
+
+def bench_cubes(ctx, sizes, min_time):
+    from cubes import CubeSearch
+    from cubes_cpu import CpuCubeSearch
+
+    targets = range(0, 101)
+    searches = {
+        'exact': CubeSearch(targets, ctx=ctx),
+        'float': CubeSearch(targets, ctx=ctx, exact=False),
+        'cpu': CpuCubeSearch(targets),
+    }
+    for n in sizes:
+        box = (-n, n), (-n, n), (-n, n)
+        for name, search in searches.items():
+            seconds = measure(lambda: search.find(*box), min_time)
+            yield _result(
+                f'cubes/{name}/{n}',
+                {'search': name, 'range': n},
+                seconds,
+                **{'searches/s': 1, 'candidates/s': (2 * n + 1) ** 3},
+            )
+    searches['cpu'].close()
+
+
+def bench_helpers(ctx, sizes, min_time):
+    from agent import AgentStore, agents_to_array, spawn_agents, update_agents
+    from vector import Vector, VectorArray, random_vectors_in_circle
+
+    rng = np.random.default_rng(0)
+    for count in sizes:
+        vectors = VectorArray(rng.uniform(-1, 1, (count, 2)))
+        store = AgentStore.from_interleaved(spawn_agents(count, (0, 0, 1024, 1024), rng=0))
+        # A copy, agents_to_array is a view of the store
+        data = agents_to_array(store).copy()
+
+        cases = {
+            'spawn_agents': lambda: spawn_agents(count, (0, 0, 1024, 1024), rng=rng),
+            'random_vectors_in_circle': lambda: random_vectors_in_circle(Vector(0, 0), 1, count, rng),
+            'vector_normalize': lambda: vectors.normalize(),
+            'vector_add_scale': lambda: (vectors + vectors).scale(0.5),
+            'agents_to_array': lambda: agents_to_array(store),
+            'update_agents': lambda: update_agents(store, data),
+        }
+        for name, fn in cases.items():
+            seconds = measure(fn, min_time)
+            yield _result(f'helpers/{name}/{count}', {'count': count}, seconds, **{'items/s': count})
+
+
+def trail_accuracy(reference, trail, block=8):
+    '''
+    returns how far a trail is from a reference trail of a sim seeded the
+    same way. Single agents diverge within a few steps, so only the relative
+    error of the total trail and the correlation of the trail density over
+    block x block cells are compared.
+    '''
+    height, width = (np.array(reference.shape) // block) * block
+
+    def density(trail):
+        return trail[:height, :width].reshape(height // block, block, width // block, block).mean(axis=(1, 3)).ravel()
+
+    return {
+        'trail_sum_error': float(trail.sum() / reference.sum() - 1),
+        'trail_correlation': float(np.corrcoef(density(reference), density(trail))[0, 1]),
+    }
+
+
+def bench_formats(ctx, sizes, min_time):
+    from agent import AGENT_FORMATS, pack_agents, spawn_agents, unpack_agents
+    from physarum import PhysarumSim
+
+    for size, agents in sizes:
+        reference = None
+        for trail_dtype, agent_format in FORMATS:
+            sim = PhysarumSim(size, agents, ctx=ctx, seed=0, trail_dtype=trail_dtype, agent_format=agent_format)
+            sim.step(ACCURACY_STEPS)
+            trail = sim.read_trail()
+            if reference is None:
+                reference = trail
+
+            # How much packing alone moves the agents
+            bounds = (0, 0, *size)
+            spawned = spawn_agents(agents, bounds, 'uniform', 0).reshape(-1, 3)
+            unpacked = unpack_agents(pack_agents(spawned, agent_format, bounds), agent_format, bounds)
+            turn = np.angle(np.exp(1j * (unpacked[:, 2] - spawned[:, 2])))
+
+            seconds = measure(sim.step, min_time, ctx.finish)
+            result = _result(
+                f'formats/{trail_dtype}-{agent_format}/{size[0]}x{size[1]}/{agents}',
+                {
+                    'trail_dtype': trail_dtype,
+                    'agent_format': agent_format,
+                    'size': list(size),
+                    'agents': agents,
+                    'agent_bytes': AGENT_FORMATS[agent_format][2],
+                    'trail_bytes': int(trail_dtype[1:]),
+                },
+                seconds,
+                **{'steps/s': 1, 'agent_steps/s': agents, 'cells/s': size[0] * size[1]},
+            )
+            result['accuracy'] = {
+                'position_error': float(np.abs(unpacked[:, :2] - spawned[:, :2]).max()),
+                'angle_error': float(np.abs(turn).max()),
+                **trail_accuracy(reference, trail),
+            }
+            yield result
+
+
+SUITES = {
+    'physarum': bench_physarum,
+    'particles': bench_particles,
+    'cubes': bench_cubes,
+    'helpers': bench_helpers,
+    'formats': bench_formats,
+}
+
+
+def run(ctx=None, size='small', suites=None, min_time=0.5, log=print):
+    '''
+    runs the named suites, all of them by default, at one of the SIZES and
+    returns a report of every result keyed by name
+    '''
+    if ctx is None:
+        ctx = moderngl.create_standalone_context()
+
+    report = {
+        'meta': {
+            'size': size,
+            'renderer': ctx.info['GL_RENDERER'],
+            'gl_version': ctx.version_code,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'cpus': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': {},
+    }
+    for suite in suites or SUITES:
+        for result in SUITES[suite](ctx, SIZES[size][suite], min_time):
+            report['results'][result['name']] = result
+            if log is not None:
+                rates = ', '.join(f'{rate:.4g} {unit}' for unit, rate in result['rates'].items())
+                accuracy = ''.join(f', {name} {value:.3g}' for name, value in result.get('accuracy', {}).items())
+                log(f'{result["name"]}: {rates}{accuracy}')
+    return report
+
+
+def compare(report, baseline, tolerance=0.1):
+    '''
+    returns (name, unit, baseline rate, rate) for every rate in report that
+    is more than tolerance slower than the same rate in baseline
+    '''
+    regressions = []
+    for name, result in report['results'].items():
+        previous = baseline['results'].get(name)
+        if previous is None:
+            continue
+        for unit, rate in result['rates'].items():
+            before = previous['rates'].get(unit)
+            if before and rate < before * (1 - tolerance):
+                regressions.append((name, unit, before, rate))
+    return regressions
+
+
+if __name__ == '__main__':
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description='headless benchmarks of every GPU and CPU path')
+    parser.add_argument('--size', choices=SIZES, default='small')
+    parser.add_argument('--suite', action='append', choices=SUITES, help='suites to run, all by default')
+    parser.add_argument('--min-time', type=float, default=0.5, help='seconds to time each benchmark for')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare against the results in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='slowdown allowed before failing')
+    parser.add_argument('--gl-backend', help="context backend, like 'egl' on machines without X")
+    args = parser.parse_args()
+
+    kwargs = {'backend': args.gl_backend} if args.gl_backend else {}
+    report = run(moderngl.create_standalone_context(**kwargs), args.size, args.suite, args.min_time)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for name, unit, before, rate in regressions:
+            print(f'REGRESSION {name}: {before:.4g} -> {rate:.4g} {unit} ({rate / before - 1:+.0%})')
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,309 @@
+import moderngl
+import numpy as np
+
+from pipeline import pipelined
+from readback import read_buffer
+
+# Largest |x|, |y|, |z| the exact kernel accepts, so that every sum of three
+# cubes fits in a signed 64-bit integer
+EXACT_LIMIT = 1 << 20
+
+# The one mapping between linear indices and points of a box, z fastest,
+# shared by the shaders and index_to_coord on the host
+INDEX_TO_COORD = '''
+    ivec3 index_to_coord(int index, ivec3 lo, ivec3 dims) {
+        return lo + ivec3(index / (dims.y * dims.z), index / dims.z % dims.y, index % dims.z);
+    }
+'''
+
+FLOAT_VERTEX_SHADER = '''
+    #version 330
+''' + INDEX_TO_COORD + '''
+    uniform ivec3 lo;
+    uniform ivec3 dims;
+
+    // Sorted targets in one row
+    uniform sampler2D targets;
+
+    flat out ivec3 pos;
+    flat out int hit;
+
+    bool is_target(float value) {
+        int low = 0;
+        int high = textureSize(targets, 0).x - 1;
+        while (low <= high) {
+            int middle = (low + high) / 2;
+            float target = texelFetch(targets, ivec2(middle, 0), 0).r;
+            if (target == value) return true;
+            if (target < value) low = middle + 1;
+            else high = middle - 1;
+        }
+        return false;
+    }
+
+    void main() {
+        pos = index_to_coord(gl_VertexID, lo, dims);
+        vec3 p = vec3(pos);
+
+        // pow() is undefined for negative bases
+        float value = p.x * p.x * p.x + p.y * p.y * p.y + p.z * p.z * p.z;
+
+        hit = is_target(value) ? 1 : 0;
+    }
+'''
+
+EXACT_VERTEX_SHADER = '''
+    #version 330
+''' + INDEX_TO_COORD + '''
+    uniform ivec3 lo;
+    uniform ivec3 dims;
+
+    // Sorted targets in one row, as the low and high 32 bits
+    uniform usampler2D targets;
+
+    flat out ivec3 pos;
+    flat out int hit;
+
+    // 64-bit integers are (low, high) pairs of 32-bit limbs, two's complement
+
+    uvec2 mul32(uint a, uint b) {
+        uint a0 = a & 0xFFFFu;
+        uint a1 = a >> 16;
+        uint b0 = b & 0xFFFFu;
+        uint b1 = b >> 16;
+        uint p00 = a0 * b0;
+        uint p01 = a0 * b1;
+        uint p10 = a1 * b0;
+        uint middle = (p00 >> 16) + (p01 & 0xFFFFu) + (p10 & 0xFFFFu);
+        return uvec2(
+            (middle << 16) | (p00 & 0xFFFFu),
+            a1 * b1 + (p01 >> 16) + (p10 >> 16) + (middle >> 16)
+        );
+    }
+
+    uvec2 mul64(uvec2 a, uint b) {
+        uvec2 low = mul32(a.x, b);
+        return uvec2(low.x, low.y + a.y * b);
+    }
+
+    uvec2 add64(uvec2 a, uvec2 b) {
+        uint low = a.x + b.x;
+        return uvec2(low, a.y + b.y + (low < a.x ? 1u : 0u));
+    }
+
+    uvec2 cube(int v) {
+        uint m = uint(abs(v));
+        uvec2 c = mul64(mul32(m, m), m);
+        return v < 0 ? add64(~c, uvec2(1u, 0u)) : c;
+    }
+
+    int compare(uvec2 a, uvec2 b) {
+        if (a.y != b.y) return int(a.y) < int(b.y) ? -1 : 1;
+        if (a.x != b.x) return a.x < b.x ? -1 : 1;
+        return 0;
+    }
+
+    bool is_target(uvec2 value) {
+        int low = 0;
+        int high = textureSize(targets, 0).x - 1;
+        while (low <= high) {
+            int middle = (low + high) / 2;
+            int order = compare(texelFetch(targets, ivec2(middle, 0), 0).xy, value);
+            if (order == 0) return true;
+            if (order < 0) low = middle + 1;
+            else high = middle - 1;
+        }
+        return false;
+    }
+
+    void main() {
+        pos = index_to_coord(gl_VertexID, lo, dims);
+
+        uvec2 value = add64(add64(cube(pos.x), cube(pos.y)), cube(pos.z));
+
+        hit = is_target(value) ? 1 : 0;
+    }
+'''
+
+
+def index_to_coord(index, lo, dims):
+    '''
+    returns the (N, 3) points of a box at linear indices, like the shaders'
+    index_to_coord
+    '''
+    index = np.asarray(index, dtype=np.int64)
+    coords = np.stack([index // (dims[1] * dims[2]), index // dims[2] % dims[1], index % dims[2]], axis=-1)
+    return coords + np.asarray(lo, dtype=np.int64)
+
+
+def box_coords(x_range, y_range, z_range, dtype='i4'):
+    '''
+    returns every point of the inclusive ranges as an (N, 3) array, in
+    index order
+    '''
+    lo = [r[0] for r in (x_range, y_range, z_range)]
+    dims = [r[1] - r[0] + 1 for r in (x_range, y_range, z_range)]
+    coords = np.indices(dims, dtype=dtype).reshape(3, -1).T + np.asarray(lo, dtype=dtype)
+    return np.ascontiguousarray(coords)
+
+
+def tiles(x_range, y_range, z_range, batch_size):
+    '''
+    splits the inclusive ranges into boxes of at most batch_size points and
+    yields each as (lo, dims), whole rows first so boxes stay large
+    '''
+    lo = [int(x_range[0]), int(y_range[0]), int(z_range[0])]
+    hi = [int(x_range[1]) + 1, int(y_range[1]) + 1, int(z_range[1]) + 1]
+    nx, ny, nz = (h - l for h, l in zip(hi, lo))
+    if min(nx, ny, nz) <= 0:
+        return
+
+    if ny * nz <= batch_size:
+        step = batch_size // (ny * nz)
+        for x in range(lo[0], hi[0], step):
+            yield (x, lo[1], lo[2]), (min(step, hi[0] - x), ny, nz)
+    elif nz <= batch_size:
+        step = batch_size // nz
+        for x in range(lo[0], hi[0]):
+            for y in range(lo[1], hi[1], step):
+                yield (x, y, lo[2]), (1, min(step, hi[1] - y), nz)
+    else:
+        for x in range(lo[0], hi[0]):
+            for y in range(lo[1], hi[1]):
+                for z in range(lo[2], hi[2], batch_size):
+                    yield (x, y, z), (1, 1, min(batch_size, hi[2] - z))
+
+
+class CubeSearch:
+    '''
+    Searches boxes of integer (x, y, z) for x^3 + y^3 + z^3 in a set of
+    targets on the GPU. The box is cut into batches of at most batch_size
+    candidates that are generated from gl_VertexID, so no input buffer is
+    needed and memory does not grow with the size of the search.
+
+    Misses never reach the output buffer: a geometry shader only emits the
+    candidates that hit, and a query counts how many it emitted, so the
+    readback is proportional to the number of hits. The output buffer
+    starts at hit_capacity hits and grows when a batch overflows it.
+
+    Up to depth batches are in flight at once, each with its own output
+    buffer and query, and the hits of one batch are checked on a worker
+    thread while the next ones run.
+
+    With exact set, the cubes are summed in emulated 64-bit integers and
+    every hit is exact for coordinates up to EXACT_LIMIT. Otherwise they are
+    summed in float, which is faster but only exact up to about 2^24, so
+    large sums can be missed. Either way the hits are checked again on the
+    host in int64, so no false positive is ever returned.
+    '''
+
+    def __init__(self, targets, ctx=None, batch_size=1 << 22, hit_capacity=1 << 12, exact=True, depth=2):
+        if ctx is None:
+            ctx = moderngl.create_standalone_context()
+        self.ctx = ctx
+        self.batch_size = batch_size
+        self.exact = exact
+        self.depth = depth
+
+        self.targets = np.unique(np.asarray(list(targets), dtype=np.int64))
+        if len(self.targets) == 0:
+            raise ValueError('need at least one target')
+        if len(self.targets) > self.ctx.info['GL_MAX_TEXTURE_SIZE']:
+            raise ValueError('too many targets to fit in one texture row')
+
+        self.program = self.ctx.program(
+            vertex_shader=EXACT_VERTEX_SHADER if exact else FLOAT_VERTEX_SHADER,
+            geometry_shader='''
+                #version 330
+
+                layout(points) in;
+                layout(points, max_vertices = 1) out;
+
+                flat in ivec3 pos[];
+                flat in int hit[];
+
+                flat out ivec3 out_pos;
+
+                void main() {
+                    if (hit[0] == 1) {
+                        out_pos = pos[0];
+                        EmitVertex();
+                        EndPrimitive();
+                    }
+                }
+            ''',
+            varyings=['out_pos'],
+        )
+
+        if exact:
+            # Little endian int64 is already the (low, high) pairs the shader reads
+            self.targets_texture = self.ctx.texture((len(self.targets), 1), 2, self.targets.astype('<i8').tobytes(), dtype='u4')
+        else:
+            self.targets_texture = self.ctx.texture((len(self.targets), 1), 1, self.targets.astype('f4').tobytes(), dtype='f4')
+        self.targets_texture.filter = moderngl.NEAREST, moderngl.NEAREST
+
+        self.vao = self.ctx.vertex_array(self.program, [])
+        self.buffers = [self.ctx.buffer(reserve=hit_capacity * 12) for _ in range(depth)]
+        self.queries = [self.ctx.query(primitives=True) for _ in range(depth)]
+
+        # Surfaceless contexts need some complete framebuffer bound to draw
+        self.fbo = self.ctx.simple_framebuffer((1, 1))
+
+    def _submit(self, slot, batch):
+        '''
+        queues one batch, writing its hits into the buffer of slot
+        '''
+        lo, dims = batch
+        self.program['lo'] = lo
+        self.program['dims'] = dims
+        with self.queries[slot]:
+            self.vao.transform(self.buffers[slot], mode=moderngl.POINTS, vertices=int(np.prod(dims)))
+
+    def _collect(self, slot, batch):
+        '''
+        waits for the batch in slot and returns its (N, 3) hits
+        '''
+        count = self.queries[slot].primitives
+        if count * 12 > self.buffers[slot].size:
+            # Transform feedback stopped writing when the buffer was full
+            self.buffers[slot].orphan(count * 12)
+            self._submit(slot, batch)
+        return read_buffer(self.buffers[slot], ('i4', 3), count)
+
+    def _check(self, batch, coords):
+        '''
+        returns the hits of a batch that are exact hits, with their values
+        '''
+        coords = coords.astype(np.int64)
+        values = (coords ** 3).sum(axis=1)
+        hits = np.isin(values, self.targets)
+        return np.column_stack([coords[hits], values[hits]])
+
+    def search(self, x_range, y_range, z_range):
+        '''
+        yields an (N, 4) int64 array of x, y, z, x^3 + y^3 + z^3 for the hits
+        of every batch over the inclusive ranges, as the batches finish
+        '''
+        if self.exact and max(abs(int(v)) for v in (*x_range, *y_range, *z_range)) > EXACT_LIMIT:
+            raise ValueError(f'exact search is limited to coordinates within +-{EXACT_LIMIT}')
+
+        self.fbo.use()
+        self.targets_texture.use(location=0)
+
+        batches = tiles(x_range, y_range, z_range, self.batch_size)
+        for hits in pipelined(batches, self._submit, self._collect, self._check, self.depth):
+            if len(hits):
+                yield hits
+
+    def find(self, x_range, y_range, z_range):
+        '''
+        returns every hit over the inclusive ranges as a list of
+        (x, y, z, value) tuples in x, y, z order
+        '''
+        return [tuple(int(v) for v in hit) for batch in self.search(x_range, y_range, z_range) for hit in batch]
+
+
+if __name__ == '__main__':
+    search = CubeSearch(range(0, 11))
+    for x, y, z, value in search.find((-10, 10), (-10, 10), (-10, 10)):
+        print(f'{x}^3 + {y}^3 + {z}^3 = {value}')
@@ -0,0 +1,130 @@
+import multiprocessing
+import os
+
+import numpy as np
+
+from cubes import EXACT_LIMIT
+
+
+def _solve(args):
+    '''
+    returns the (N, 4) hits with z in zs. For every z, y and target the
+    only x that can have x^3 = target - z^3 - y^3 is the rounded cube root
+    of the remainder, so it indexes the table of x cubes directly and one
+    comparison per remainder checks it
+    '''
+    targets, x_range, y_range, zs, batch_size = args
+    x = np.arange(x_range[0], x_range[1] + 1, dtype=np.int64)
+    y = np.arange(y_range[0], y_range[1] + 1, dtype=np.int64)
+    x_cubes = x ** 3
+    y_cubes = y ** 3
+
+    # As many z as keep the (z, target, y) remainders under batch_size
+    step = max(1, batch_size // (len(targets) * len(y)))
+
+    found = [np.empty((0, 4), dtype=np.int64)]
+    for start in range(0, len(zs), step):
+        z = zs[start:start + step]
+        rest = targets[None, :, None] - (z ** 3)[:, None, None] - y_cubes[None, None, :]
+        # Doubles hold the remainders to well under half a unit of their root
+        index = (np.rint(np.cbrt(rest.astype(np.float64))).astype(np.int64) - x_range[0]).clip(0, len(x_cubes) - 1)
+        zi, ti, yi = np.nonzero(x_cubes[index] == rest)
+        found.append(np.column_stack([x[index[zi, ti, yi]], y[yi], z[zi], targets[ti]]))
+    return np.concatenate(found)
+
+
+class CpuCubeSearch:
+    '''
+    CubeSearch on the CPU by meeting in the middle: instead of trying every
+    (x, y, z), every (z, y) pair looks its missing x^3 up in a table of
+    cubes indexed by x, which is O(n^2) per target instead of O(n^3). The z
+    values are split over a pool of worker processes, started by the first
+    search and stopped by close() or by leaving a with block. Has the same
+    API as CubeSearch and finds exactly the same hits, so the two can check
+    each other.
+    '''
+
+    def __init__(self, targets, workers=None, batch_size=1 << 22):
+        self.targets = np.unique(np.asarray(list(targets), dtype=np.int64))
+        if len(self.targets) == 0:
+            raise ValueError('need at least one target')
+        self.workers = workers or os.cpu_count()
+        self.batch_size = batch_size
+        self.pool = None
+
+    def search(self, x_range, y_range, z_range):
+        '''
+        yields an (N, 4) int64 array of x, y, z, x^3 + y^3 + z^3 for the hits
+        of every shard of z over the inclusive ranges, as the shards finish
+        '''
+        if max(abs(int(v)) for v in (*x_range, *y_range, *z_range)) > EXACT_LIMIT:
+            raise ValueError(f'search is limited to coordinates within +-{EXACT_LIMIT}')
+        if min(r[1] - r[0] for r in (x_range, y_range, z_range)) < 0:
+            return
+
+        # No sum in range reaches further, and dropping the rest keeps the
+        # remainders from overflowing int64
+        targets = self.targets[np.abs(self.targets) <= 3 * EXACT_LIMIT ** 3]
+        if len(targets) == 0:
+            return
+
+        zs = np.arange(z_range[0], z_range[1] + 1, dtype=np.int64)
+        shards = [
+            (targets, x_range, y_range, shard, self.batch_size)
+            for shard in np.array_split(zs, min(len(zs), 4 * self.workers))
+        ]
+
+        if self.workers == 1:
+            results = map(_solve, shards)
+        else:
+            if self.pool is None:
+                self.pool = multiprocessing.Pool(self.workers)
+            results = self.pool.imap(_solve, shards)
+        for hits in results:
+            if len(hits):
+                yield hits
+
+    def find(self, x_range, y_range, z_range):
+        '''
+        returns every hit over the inclusive ranges as a list of
+        (x, y, z, value) tuples in x, y, z order, like CubeSearch.find
+        '''
+        hits = np.concatenate([np.empty((0, 4), dtype=np.int64), *self.search(x_range, y_range, z_range)])
+        hits = hits[np.lexsort(hits[:, 2::-1].T)]
+        return [tuple(int(v) for v in hit) for hit in hits]
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    from cubes import CubeSearch
+
+    # Cross-check against the GPU search
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    targets = range(0, 101)
+    box = (-n, n), (-n, n), (-n, n)
+
+    start = time.perf_counter()
+    expected = CubeSearch(targets).find(*box)
+    gpu = time.perf_counter() - start
+
+    with CpuCubeSearch(targets) as search:
+        start = time.perf_counter()
+        found = search.find(*box)
+        cpu = time.perf_counter() - start
+
+    print(f'{len(found)} hits, same as the GPU: {found == expected}')
+    print(f'GPU {gpu:.2f}s, CPU {cpu:.2f}s')
@@ -0,0 +1,348 @@
+import moderngl
+import numpy as np
+
+from profiler import scope
+
+# Passes over the trail map draw this quad, one fragment per cell
+QUAD_VERTEX_SHADER = '''
+    #version 330
+
+    in vec2 in_vert;
+
+    void main() {
+        gl_Position = vec4(in_vert, 0.0, 1.0);
+    }
+'''
+
+MAX_RADIUS = 32
+
+
+def quad_buffer(ctx):
+    '''
+    returns a buffer with a triangle strip covering the whole viewport
+    '''
+    return ctx.buffer(np.array([
+        # x    y
+        -1.0, -1.0,  # lower left
+        -1.0,  1.0,  # upper left
+        1.0,  -1.0,  # lower right
+        1.0,   1.0,  # upper right
+    ], dtype='f4'))
+
+
+def kernel_weights(radius, kernel='box'):
+    '''
+    returns the normalized weights of one axis of a separable kernel,
+    from the center tap outwards
+    '''
+    if not 0 <= radius <= MAX_RADIUS:
+        raise ValueError(f'radius must be between 0 and {MAX_RADIUS}')
+
+    offsets = np.arange(radius + 1)
+    if kernel == 'box':
+        weights = np.ones(radius + 1)
+    elif kernel == 'gaussian':
+        sigma = max(radius / 2, 0.5)
+        weights = np.exp(-offsets ** 2 / (2 * sigma ** 2))
+    else:
+        raise ValueError(f'unknown kernel {kernel!r}')
+
+    # Every tap but the center one is used on both sides
+    return weights / (weights[0] + 2 * weights[1:].sum())
+
+
+class DiffusionStage:
+    '''
+    Blurs and decays the trail map with two full screen passes into
+    framebuffer textures. The blur is separable: the horizontal pass writes
+    into a scratch texture, the vertical pass mixes the result with the
+    original trail and writes into the back side of the trail ping-pong.
+    Trails with up to 4 components have every channel diffused the same way.
+
+    Half float trails lose deposits once a cell is large enough that adding
+    one rounds back to the same half, and framebuffers may truncate what is
+    written to them. So with dtype 'f2' the agents deposit into the scratch
+    texture through self.deposit instead, a pass adds the whole step's
+    deposit to the trail at once and every pass rounds to the nearest half
+    float itself. Large cells still move in steps of the half float spacing.
+    '''
+
+    def __init__(self, ctx, size, radius=1, kernel='box', diffuse_rate=0.2, decay_rate=0.07, dtype='f4',
+                 components=1):
+        self.ctx = ctx
+        self.size = size
+        self.components = components
+        self.dtype = dtype
+        # Set by the sims to time the passes
+        self.profiler = None
+
+        self._create_passes(dtype)
+
+        self.set_kernel(radius, kernel)
+        self.diffuse_rate = diffuse_rate
+        self.decay_rate = decay_rate
+
+    def _create_passes(self, dtype):
+        self.horizontal_prog = self.ctx.program(
+            vertex_shader=QUAD_VERTEX_SHADER,
+            fragment_shader=self._blur_shader('ivec2(k, 0)', '''
+                out_vert = store(sum);
+            '''),
+        )
+
+        self.vertical_prog = self.ctx.program(
+            vertex_shader=QUAD_VERTEX_SHADER,
+            fragment_shader=self._blur_shader('ivec2(0, k)', '''
+                {cell} diffused = mix(texelFetch(Trail, in_text, 0).{channels}, sum, diffuse_rate);
+                out_vert = store(max(diffused - decay_rate, 0.0));
+            '''),
+        )
+        self.vertical_prog['Trail'] = 1
+
+        self.scratch = self.ctx.texture(self.size, self.components, dtype=dtype)
+        self.scratch.filter = moderngl.NEAREST, moderngl.NEAREST
+        self.scratch_fbo = self.ctx.framebuffer(color_attachments=[self.scratch])
+
+        self.quad_vbo = quad_buffer(self.ctx)
+        self.horizontal_vao = self.ctx.simple_vertex_array(self.horizontal_prog, self.quad_vbo, 'in_vert')
+        self.vertical_vao = self.ctx.simple_vertex_array(self.vertical_prog, self.quad_vbo, 'in_vert')
+
+        # Framebuffer the agents deposit into, None when they blend straight
+        # into the trail. The scratch texture is free until the blur.
+        self.deposit = None
+        if dtype == 'f2':
+            self.deposit = self.scratch_fbo
+            self.deposit_prog = self.ctx.program(
+                vertex_shader=QUAD_VERTEX_SHADER,
+                fragment_shader=self._shader('''
+                    ivec2 in_text = ivec2(gl_FragCoord.xy);
+                    out_vert = store(texelFetch(Trail, in_text, 0).{channels} + cell(in_text));
+                '''),
+            )
+            self.deposit_prog['Trail'] = 1
+            self.deposit_vao = self.ctx.simple_vertex_array(self.deposit_prog, self.quad_vbo, 'in_vert')
+
+    def _blur_shader(self, step, result):
+        return self._shader(f'''
+                ivec2 in_text = ivec2(gl_FragCoord.xy);
+
+                {{cell}} sum = weights[0] * cell(in_text);
+                for (int k = 1; k <= radius; k++) {{{{
+                    sum += weights[k] * (cell(in_text + {step}) + cell(in_text - {step}));
+                }}}}
+
+                {result}
+        ''')
+
+    def _shader(self, main):
+        cell = 'float' if self.components == 1 else f'vec{self.components}'
+        channels = 'rgba'[:self.components]
+        main = main.format(cell=cell, channels=channels)
+        if self.dtype == 'f2':
+            # The spacing of half floats around value, never below the smallest subnormal
+            store = f'''
+                {cell} ulp = exp2(max(floor(log2(max(value, 0.00000006))), -14.0) - 10.0);
+                return round(value / ulp) * ulp;
+            '''
+        else:
+            store = 'return value;'
+        return f'''
+            #version 330
+
+            uniform sampler2D Texture;
+            uniform sampler2D Trail;
+
+            uniform int radius;
+            uniform float weights[{MAX_RADIUS + 1}];
+            uniform float diffuse_rate;
+            uniform float decay_rate;
+
+            out {cell} out_vert;
+
+            {cell} store({cell} value) {{
+                {store}
+            }}
+
+            {cell} cell(ivec2 pos) {{
+                ivec2 tSize = textureSize(Texture, 0).xy;
+                return texelFetch(Texture, (pos + tSize) % tSize, 0).{channels};
+            }}
+
+            void main() {{
+                {main}
+            }}
+        '''
+
+    def set_kernel(self, radius, kernel='box'):
+        '''
+        changes the blur radius and kernel shape without recompiling
+        '''
+        weights = np.zeros(MAX_RADIUS + 1, dtype='f4')
+        weights[:radius + 1] = kernel_weights(radius, kernel)
+
+        self.radius = radius
+        self.kernel = kernel
+        for prog in (self.horizontal_prog, self.vertical_prog):
+            prog['radius'] = radius
+            prog['weights'].write(weights.tobytes())
+
+    @property
+    def diffuse_rate(self):
+        return self.vertical_prog['diffuse_rate'].value
+
+    @diffuse_rate.setter
+    def diffuse_rate(self, value):
+        self.vertical_prog['diffuse_rate'] = value
+
+    @property
+    def decay_rate(self):
+        return self.vertical_prog['decay_rate'].value
+
+    @decay_rate.setter
+    def decay_rate(self, value):
+        self.vertical_prog['decay_rate'] = value
+
+    def apply(self, trail):
+        '''
+        diffuses the front texture of a trail ping-pong of (texture, fbo)
+        sides into its back, then swaps. What the agents put into
+        self.deposit is added to the trail first.
+        '''
+        if self.deposit is not None:
+            self.scratch.use(location=0)
+            trail.front[0].use(location=1)
+            trail.back[1].use()
+            with scope(self.profiler, 'deposit_add'):
+                self.deposit_vao.render(moderngl.TRIANGLE_STRIP)
+            trail.swap()
+
+        texture = trail.front[0]
+
+        texture.use(location=0)
+        self.scratch_fbo.use()
+        with scope(self.profiler, 'diffuse_horizontal'):
+            self.horizontal_vao.render(moderngl.TRIANGLE_STRIP)
+
+        self.scratch.use(location=0)
+        texture.use(location=1)
+        trail.back[1].use()
+        with scope(self.profiler, 'diffuse_vertical'):
+            self.vertical_vao.render(moderngl.TRIANGLE_STRIP)
+
+        trail.swap()
+
+
+class ComputeDiffusionStage(DiffusionStage):
+    '''
+    Same blur and decay as DiffusionStage, as two compute passes over r32f
+    images for contexts that support GL 4.3.
+
+    Compute agents cannot blend into the trail, so they count themselves
+    into an r32ui deposit image instead. The horizontal pass adds those
+    counts to the trail as it reads it and the vertical pass clears them,
+    which saves a separate full grid pass for the deposit.
+    '''
+
+    LOCAL_SIZE = 16
+
+    def _create_passes(self, dtype):
+        self.horizontal_prog = self.ctx.compute_shader(self._blur_shader(
+            'ivec2(k, 0)',
+            'imageLoad(Texture, pos).r + deposit_amount * float(imageLoad(Deposit, pos).r)',
+            '''
+                imageStore(Result, in_text, vec4(sum));
+            ''',
+        ))
+
+        self.vertical_prog = self.ctx.compute_shader(self._blur_shader(
+            'ivec2(0, k)',
+            'imageLoad(Texture, pos).r',
+            '''
+                float deposited = imageLoad(Trail, in_text).r + deposit_amount * float(imageLoad(Deposit, in_text).r);
+                imageStore(Deposit, in_text, uvec4(0));
+
+                float diffused = mix(deposited, sum, diffuse_rate);
+                imageStore(Result, in_text, vec4(max(0, diffused - decay_rate)));
+            ''',
+        ))
+
+        self.scratch = self.ctx.texture(self.size, 1, dtype=dtype)
+        self.scratch.filter = moderngl.NEAREST, moderngl.NEAREST
+
+        self.groups = (
+            (self.size[0] + self.LOCAL_SIZE - 1) // self.LOCAL_SIZE,
+            (self.size[1] + self.LOCAL_SIZE - 1) // self.LOCAL_SIZE,
+        )
+
+        self.deposit_amount = 1.0
+
+    @classmethod
+    def _blur_shader(cls, step, source, result):
+        return f'''
+            #version 430
+
+            layout(local_size_x = {cls.LOCAL_SIZE}, local_size_y = {cls.LOCAL_SIZE}) in;
+
+            layout(r32f, binding = 0) uniform readonly image2D Texture;
+            layout(r32f, binding = 1) uniform readonly image2D Trail;
+            layout(r32f, binding = 2) uniform writeonly image2D Result;
+            layout(r32ui, binding = 3) uniform uimage2D Deposit;
+
+            uniform int radius;
+            uniform float weights[{MAX_RADIUS + 1}];
+            uniform float diffuse_rate;
+            uniform float decay_rate;
+            uniform float deposit_amount;
+
+            float cell(ivec2 pos) {{
+                ivec2 tSize = imageSize(Texture);
+                pos = (pos + tSize) % tSize;
+                return {source};
+            }}
+
+            void main() {{
+                ivec2 in_text = ivec2(gl_GlobalInvocationID.xy);
+                if (any(greaterThanEqual(in_text, imageSize(Texture)))) return;
+
+                float sum = weights[0] * cell(in_text);
+                for (int k = 1; k <= radius; k++) {{
+                    sum += weights[k] * (cell(in_text + {step}) + cell(in_text - {step}));
+                }}
+
+                {result}
+            }}
+        '''
+
+    @property
+    def deposit_amount(self):
+        return self.vertical_prog['deposit_amount'].value
+
+    @deposit_amount.setter
+    def deposit_amount(self, value):
+        self.horizontal_prog['deposit_amount'] = value
+        self.vertical_prog['deposit_amount'] = value
+
+    def apply(self, trail, deposit):
+        '''
+        adds the agent counts in deposit to the front texture of a trail
+        ping-pong, diffuses it into the back and swaps. deposit is left
+        cleared for the next step.
+        '''
+        texture = trail.front[0]
+
+        deposit.bind_to_image(3, read=True, write=True)
+
+        texture.bind_to_image(0, read=True, write=False)
+        self.scratch.bind_to_image(2, read=False, write=True)
+        with scope(self.profiler, 'diffuse_horizontal'):
+            self.horizontal_prog.run(*self.groups)
+            self.ctx.memory_barrier(moderngl.SHADER_IMAGE_ACCESS_BARRIER_BIT)
+
+        self.scratch.bind_to_image(0, read=True, write=False)
+        texture.bind_to_image(1, read=True, write=False)
+        trail.back[0].bind_to_image(2, read=False, write=True)
+        with scope(self.profiler, 'diffuse_vertical'):
+            self.vertical_prog.run(*self.groups)
+            self.ctx.memory_barrier(moderngl.SHADER_IMAGE_ACCESS_BARRIER_BIT)
+
+        trail.swap()
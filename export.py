@@ -0,0 +1,124 @@
+import os
+import shutil
+import subprocess
+import time
+
+import numpy as np
+from PIL import Image
+
+from pipeline import pipelined
+from readback import read_buffer
+
+
+class PngWriter:
+    '''
+    writes frames as a numbered PNG sequence, pattern being a path with a
+    printf style frame number like 'frames/%05d.png'
+    '''
+
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.frames = 0
+        directory = os.path.dirname(pattern)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def write(self, frame):
+        Image.fromarray(frame).save(self.pattern % self.frames)
+        self.frames += 1
+
+    def close(self):
+        pass
+
+
+class FfmpegWriter:
+    '''
+    pipes raw RGB frames into an ffmpeg process that encodes them to path
+    '''
+
+    def __init__(self, path, size, fps=60, ffmpeg='ffmpeg'):
+        if shutil.which(ffmpeg) is None:
+            raise RuntimeError(f'{ffmpeg} was not found, write a PNG sequence instead')
+        width, height = size
+        self.process = subprocess.Popen([
+            ffmpeg, '-y', '-loglevel', 'error',
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+            '-pix_fmt', 'yuv420p', path,
+        ], stdin=subprocess.PIPE)
+
+    def write(self, frame):
+        self.process.stdin.write(frame)
+
+    def close(self):
+        self.process.stdin.close()
+        if self.process.wait() != 0:
+            raise RuntimeError(f'ffmpeg exited with code {self.process.returncode}')
+
+
+def export(scene, frames, output, size=(1920, 1080), steps=1, fps=60, depth=3, ctx=None):
+    '''
+    renders frames frames of scene offscreen at size, advancing it by steps
+    before each one, and writes them to output: a PNG sequence when output
+    ends in .png, like 'frames/%05d.png', and a video encoded by ffmpeg
+    otherwise. scene is anything with step(n) and draw(), like a ParticleSim
+    or a TrailView.
+
+    Each frame is copied into one of depth pixel buffers on the GPU and only
+    read back once the next frames are queued. Encoding and writing happen
+    on a worker thread. Returns the frames exported per second.
+    '''
+    ctx = ctx or scene.ctx
+    width, height = size
+
+    fbo = ctx.simple_framebuffer(size, components=3)
+    pbos = [ctx.buffer(reserve=width * height * 3) for _ in range(depth)]
+    writer = PngWriter(output) if output.endswith('.png') else FfmpegWriter(output, size, fps)
+
+    def submit(slot, frame):
+        # The sims may bind framebuffers of their own while stepping
+        fbo.use()
+        scene.step(steps)
+        fbo.use()
+        fbo.clear()
+        scene.draw()
+        fbo.read_into(pbos[slot], components=3)
+
+    def collect(slot, frame):
+        return read_buffer(pbos[slot], ('u1', 3), width * height).reshape(height, width, 3)
+
+    def write(frame, pixels):
+        # OpenGL rows start at the bottom
+        writer.write(np.ascontiguousarray(pixels[::-1]))
+
+    start = time.perf_counter()
+    try:
+        for _ in pipelined(range(frames), submit, collect, write, depth):
+            pass
+    finally:
+        writer.close()
+        for pbo in pbos:
+            pbo.release()
+        fbo.release()
+    return frames / (time.perf_counter() - start)
+
+
+if __name__ == '__main__':
+    import sys
+
+    from particles import ParticleSim
+    from physarum import TrailView, create_sim
+
+    # python export.py physarum|particles output [frames] [width] [height]
+    name, output = sys.argv[1], sys.argv[2]
+    frames = int(sys.argv[3]) if len(sys.argv) > 3 else 600
+    size = (int(sys.argv[4]), int(sys.argv[5])) if len(sys.argv) > 5 else (1920, 1080)
+
+    if name == 'physarum':
+        scene = TrailView(create_sim((480, 270), 20000))
+    elif name == 'particles':
+        scene = ParticleSim(10000)
+    else:
+        raise ValueError(f'unknown scene {name!r}')
+
+    rate = export(scene, frames, output, size)
+    print(f'{frames} frames at {size[0]}x{size[1]}: {rate:.1f} frames/s ({rate / 60:.2f}x realtime at 60 fps)')
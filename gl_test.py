@@ -1,62 +1,100 @@
-import struct
 import moderngl
-from math import ceil
+
+from cubes import INDEX_TO_COORD, index_to_coord
+from readback import read_buffer
+
+#! The inclusive range to search along each axis
+X_RANGE = (-10, 10)
+Y_RANGE = (-10, 10)
+Z_RANGE = (-10, 10)
+
+#! The corner of the box and its size along each axis
+LO = (X_RANGE[0], Y_RANGE[0], Z_RANGE[0])
+DIMS = tuple(r[1] - r[0] + 1 for r in (X_RANGE, Y_RANGE, Z_RANGE))
 
 ctx = moderngl.create_context(standalone=True)
 
 program = ctx.program(
+    #! index_to_coord turns a vertex id into a point of the box, the same
+    #! way cubes.index_to_coord does on the host
     vertex_shader="""
     #version 330
+    """ + INDEX_TO_COORD + """
+    uniform ivec3 lo;
+    uniform ivec3 dims;
 
-    // Output values for the shader. They end up in the buffer.
-    out float value;
-    out float product;
+    // Output values for the vertex shader, passed on to the geometry shader
+    flat out int id;
+    flat out int product;
 
     void main() {
-        // Implicit type conversion from int to float will happen here
-        value = gl_VertexID;
+        id = gl_VertexID;
 
-        float x = ceil(value / pow(21, 2)) - 11;
-        float y = mod(ceil(value / 21), 21) - 10;
-        float z = mod(value, 21)  - 10;
+        vec3 p = vec3(index_to_coord(id, lo, dims));
 
-        product = pow(x, 3) + pow(y, 3) + pow(z, 3);
-        if (product >= 0 && product <= 10) {
+        // pow() is undefined for negative bases
+        float sum = p.x * p.x * p.x + p.y * p.y * p.y + p.z * p.z * p.z;
+        if (sum >= 0 && sum <= 10) {
             product = 1;
         } else {
             product = 0;
         }
     }
     """,
+    #! The geometry shader only passes on the vertices that are hits, so
+    #! misses never end up in the buffer.
+    geometry_shader="""
+    #version 330
+
+    layout(points) in;
+    layout(points, max_vertices = 1) out;
+
+    flat in int id[];
+    flat in int product[];
+
+    // Output value for the shader. It ends up in the buffer.
+    flat out int value;
+
+    void main() {
+        if (product[0] == 1) {
+            value = id[0];
+            EmitVertex();
+            EndPrimitive();
+        }
+    }
+    """,
     #! What out varyings to capture in our buffer!
-    varyings=["value", "product"],
+    varyings=["value"],
 )
 
-NUM_VERTICES = 21**3
+program["lo"] = LO
+program["dims"] = DIMS
+
+NUM_VERTICES = DIMS[0] * DIMS[1] * DIMS[2]
 
 #! We always need a vertex array in order to execute a shader program.
 #! Our shader doesn't have any buffer inputs, so we give it an empty array.
 vao = ctx.vertex_array(program, [])
 
-#! Create a buffer allocating room for 20 32 bit floats
-buffer = ctx.buffer(reserve=NUM_VERTICES * 2 * 4)
+#! Create a buffer with room for one 32 bit int per vertex, in case every vertex is a hit
+buffer = ctx.buffer(reserve=NUM_VERTICES * 4)
 
-#! Start a transform with buffer as the destination.
-#! We force the vertex shader to run 10 times
-vao.transform(buffer, vertices=NUM_VERTICES)
+#! The query counts how many points the geometry shader emitted
+query = ctx.query(primitives=True)
 
-#! Unpack the 20 float values from the buffer (copy from graphics memory to system memory).
-#! Reading from the buffer will cause a sync (the python program stalls until the shader is done)
-num = 2 * NUM_VERTICES
-data = struct.unpack(str(num) + "f", buffer.read())
-for i in range(0, num, 2):
-    good = data[i+1] ==  1
+#! Start a transform with buffer as the destination.
+#! We force the vertex shader to run NUM_VERTICES times
+with query:
+    vao.transform(buffer, mode=moderngl.POINTS, vertices=NUM_VERTICES)
 
-    if not good: continue
+#! Read only the hits from the buffer (copy from graphics memory to system memory)
+#! straight into a NumPy array.
+#! Reading the query will cause a sync (the python program stalls until the shader is done)
+num = query.primitives
+data = read_buffer(buffer, [("value", "i4")], num)
 
-    id = data[i]
-    x = ceil(id / 21**2) - 11;
-    y = ceil(id / 21) % 21 - 10;
-    z = id % 21  - 10;
+#! Decode every hit at once, with the same mapping as the shader
+coords = index_to_coord(data["value"], LO, DIMS)
 
+for x, y, z in coords.tolist():
     print(f"{x}^3 + {y}^3 + {z}^3")
\ No newline at end of file
@@ -0,0 +1,134 @@
+import moderngl
+
+from agent import AGENT_FORMATS, agent_codec, pack_agents, spawn_agents
+from resources import PingPong
+
+
+class ParticleSim:
+    '''
+    Particles bouncing around clip space, without a window. step() moves
+    them with a transform and draw() renders them as points into whatever
+    framebuffer is bound, so they can be shown in a window or exported at
+    any resolution. Uses a standalone context unless one is passed in.
+    The particles are drawn from the named spawn distribution of
+    agent.spawn_agents over clip space, seeded by seed, and stored in one
+    of agent.AGENT_FORMATS.
+    '''
+
+    def __init__(self, num_agents=100, ctx=None, spawn='uniform', seed=None, agent_format='f4'):
+        if agent_format not in AGENT_FORMATS:
+            raise ValueError(f'unknown agent format {agent_format!r}, expected one of {tuple(AGENT_FORMATS)}')
+        if ctx is None:
+            ctx = moderngl.create_standalone_context()
+        self.ctx = ctx
+        self.num_agents = num_agents
+        self.steps = 0
+        self.agent_format = agent_format
+        self.bounds = (-1, -1, 1, 1)
+        codec = agent_codec(agent_format)
+
+        self.prog = self.ctx.program(
+            vertex_shader='''
+                #version 330
+            ''' + codec + '''
+                in AGENT in_agent;
+
+                out float angle;
+
+                void main() {
+                    vec3 in_vert = decode_agent(in_agent);
+                    gl_Position = vec4(in_vert.x, in_vert.y, 0.0, 1.0);
+                    angle = in_vert.z;
+                }
+            ''',
+            fragment_shader='''
+                #version 330
+
+                in float angle;
+
+                out vec3 color;
+
+                void main() {
+                    color = vec3(angle, angle, angle);
+                }
+            ''',
+        )
+
+        self.transform = self.ctx.program(
+            vertex_shader='''
+            #version 330
+        ''' + codec + '''
+            uniform float pi = 3.14159265;
+
+            in AGENT in_agent;
+
+            flat out AGENT out_agent;
+
+            vec2 in_pos;
+            float in_angle;
+
+            float random() {
+                uint state = uint(in_pos.y * 2000 + in_pos.x);
+                state ^= 2747636419u;
+                state *= 2654435769u;
+                state ^= state >> 16;
+                state *= 2654435769u;
+                state ^= state >> 16;
+                state *= 2654435769u;
+                return float(state) / 4294967295.0;
+            }
+
+            void main() {
+                vec3 agent = decode_agent(in_agent);
+                in_pos = agent.xy;
+                in_angle = agent.z;
+
+                vec2 vel = vec2(cos(in_angle), sin(in_angle));
+                vec2 out_pos = in_pos + vel * 0.002;
+                float out_angle = in_angle;
+
+                if (out_pos.x <= -1 || out_pos.x >= 1 || out_pos.y <= -1 || out_pos.y >= 1) {
+                    float x = min(0.99, max(-0.99, out_pos.x));
+                    float y = min(0.99, max(-0.99, out_pos.y));
+                    out_pos = vec2(x, y);
+                    out_angle += pi / 2 + random() * pi;
+                }
+
+                out_agent = encode_agent(vec3(out_pos, out_angle));
+            }
+        ''',
+            varyings=['out_agent']
+        )
+
+        if agent_format != 'f4':
+            self.prog['agent_bounds'] = self.bounds
+            self.transform['agent_bounds'] = self.bounds
+
+        agents = spawn_agents(self.num_agents, self.bounds, spawn, seed)
+        agents_buffer1 = self.ctx.buffer(pack_agents(agents, agent_format, self.bounds))
+        agents_buffer2 = self.ctx.buffer(reserve=agents_buffer1.size)
+        self.agents = PingPong(*[
+            (
+                buffer,
+                self.ctx.vertex_array(self.prog, [(buffer, AGENT_FORMATS[agent_format][1], 'in_agent')]),
+                self.ctx.vertex_array(self.transform, [(buffer, AGENT_FORMATS[agent_format][1], 'in_agent')]),
+            )
+            for buffer in (agents_buffer1, agents_buffer2)
+        ])
+
+    def step(self, n=1):
+        '''
+        moves the particles n fixed steps
+        '''
+        for _ in range(n):
+            buffer, vao, transform_vao = self.agents.front
+            transform_vao.transform(self.agents.back[0], vertices=self.num_agents)
+            self.agents.swap()
+            self.steps += 1
+
+    def draw(self):
+        '''
+        renders the particles as points into the bound framebuffer
+        '''
+        self.ctx.point_size = 1.0
+        self.agents.front[1].render(mode=moderngl.POINTS)
@@ -0,0 +1,495 @@
+import moderngl
+import numpy as np
+
+from agent import AGENT_FORMATS, agent_codec, pack_agents, spawn_agents, unpack_agents
+from diffusion import DiffusionStage
+from profiler import PassProfiler, scope
+from readback import read_buffer, read_texture
+from resources import LeakCheck, PingPong
+
+
+# The agent update shared by every transform feedback sim. The sim's header
+# declares the parameters, float trail_value(vec4 texel) weighing the
+# channels of the trail and void setup() running before each agent moves
+MOLD_SHADER = '''
+    uniform sampler2D Texture;
+
+    uniform float pi = 3.14159265;
+
+    in AGENT in_agent;
+
+    flat out AGENT out_agent;
+
+    vec2 in_pos;
+    float in_angle;
+
+    float cell(int x, int y) {
+        ivec2 tSize = textureSize(Texture, 0).xy;
+        return trail_value(texelFetch(Texture, ivec2((x + tSize.x) % tSize.x, (y + tSize.y) % tSize.y), 0));
+    }
+
+    float random() {
+        int width = textureSize(Texture, 0).x;
+        uint state = uint(in_pos.y * width + in_pos.x);
+        state ^= 2747636419u;
+        state *= 2654435769u;
+        state ^= state >> 16;
+        state *= 2654435769u;
+        state ^= state >> 16;
+        state *= 2654435769u;
+        return float(state) / 4294967295.0;
+    }
+
+    float sense(float angleOffset) {
+        float angle = in_angle + angleOffset;
+        vec2 senseDir = vec2(cos(angle), sin(angle));
+        vec2 sensePos = in_pos + senseDir * sensor_offset_dist;
+
+        float sum = 0.0;
+        for (int i = -1; i <= 1; i++) {
+            for (int j = -1; j <= 1; j++) {
+                vec2 pos = sensePos + vec2(i, j);
+                sum += cell(int(pos.x), int(pos.y));
+            }
+        }
+
+        return sum;
+    }
+
+    void main() {
+        vec3 agent = decode_agent(in_agent);
+        in_pos = agent.xy;
+        in_angle = agent.z;
+
+        setup();
+
+        vec2 vel = speed * vec2(cos(in_angle), sin(in_angle));
+        vec2 out_pos = in_pos + vel;
+        float out_angle;
+
+        ivec2 tSize = textureSize(Texture, 0).xy;
+
+        float forward = sense(0);
+        float left = sense(-sensor_angle_spacing);
+        float right = sense(sensor_angle_spacing);
+
+        if (forward > left && forward > right) {
+            out_angle = in_angle;
+        } else if (forward < left && forward < right) {
+            out_angle = in_angle + (random() - 0.5) * 2 * turn_speed;
+        } else if (right > left) {
+            out_angle = in_angle + turn_speed;
+        } else if (right < left) {
+            out_angle = in_angle - turn_speed;
+        } else {
+            out_angle = in_angle;
+        }
+
+        if (out_pos.x < 0 || out_pos.x >= tSize.x || out_pos.y < 0 || out_pos.y >= tSize.y) {
+            float x = min(tSize.x - 0.01, max(0, out_pos.x));
+            float y = min(tSize.y - 0.01, max(0, out_pos.y));
+            out_pos = vec2(x, y);
+            out_angle = random() * 2 * pi;
+        }
+
+        out_agent = encode_agent(vec3(out_pos, out_angle));
+    }
+'''
+
+
+class PhysarumSim:
+    '''
+    Slime mold simulation that runs without a window. Each call to step()
+    advances the simulation by one fixed step, independent of any display
+    refresh rate. Uses a standalone context unless one is passed in.
+    The agents are drawn from the named spawn distribution of
+    agent.spawn_agents, seeded by seed.
+
+    With leak_check set, the number of live moderngl objects is checked after
+    every step and a RuntimeError is raised as soon as it grows. With
+    profile set, self.profiler times every pass of a step on the GPU.
+
+    trail_dtype 'f2' keeps the trail map in half floats and agent_format
+    packs the agents into one of agent.AGENT_FORMATS, decoded and encoded
+    in the shaders, to cut memory and bandwidth at some cost in accuracy.
+    read_trail and read_agents still return float32 either way. Half float
+    trails add each step's deposit in one pass and are rounded rather than
+    truncated, which keeps the total trail within about 1% of float32; cells
+    above 2048 still only hold multiples of the half spacing. Renderers that
+    convert half floats in software, like llvmpipe, run them slower than f4.
+
+    Subclasses change what the agents carry and how they sense the trail
+    through the GLSL hooks and methods below, see SpeciesPhysarumSim.
+    '''
+
+    backend = 'transform'
+
+    # Channels of the trail map
+    components = 1
+
+    # Declarations, trail_value() and setup() for MOLD_SHADER
+    MOLD_HEADER = '''
+        uniform float speed;
+        uniform float turn_speed;
+        uniform float sensor_angle_spacing;
+        uniform float sensor_offset_dist;
+
+        float trail_value(vec4 texel) {
+            return texel.r;
+        }
+
+        void setup() {
+        }
+    '''
+    VARYINGS = ['out_agent']
+
+    # Extra declarations and statements of the deposit vertex shader
+    DEPOSIT_HEADER = ''
+    DEPOSIT_SETUP = ''
+    DEPOSIT_FRAGMENT = '''
+        #version 330
+
+        uniform float deposit_amount;
+
+        out float color;
+
+        void main() {
+            color = deposit_amount;
+        }
+    '''
+
+    def __init__(self, size=(120, 120), num_agents=100, ctx=None, leak_check=False,
+                 diffuse_radius=1, diffuse_kernel='box', deposit_amount=1.0, spawn='center-facing', seed=None,
+                 profile=False, trail_dtype='f4', agent_format='f4'):
+        if trail_dtype not in ('f4', 'f2'):
+            raise ValueError(f"trail_dtype must be 'f4' or 'f2', not {trail_dtype!r}")
+        if agent_format not in AGENT_FORMATS:
+            raise ValueError(f'unknown agent format {agent_format!r}, expected one of {tuple(AGENT_FORMATS)}')
+
+        if ctx is None:
+            ctx = moderngl.create_standalone_context()
+        self.ctx = ctx
+
+        self.leak_check = LeakCheck(ctx) if leak_check else None
+        self.profiler = PassProfiler(ctx) if profile else None
+
+        self.width, self.height = size
+        self.num_agents = num_agents
+        self.steps = 0
+        self.trail_dtype = trail_dtype
+        self.agent_format = agent_format
+        self.bounds = (0, 0, self.width, self.height)
+
+        pixels = np.zeros((self.height, self.width, self.components)).astype(trail_dtype)
+        codec = agent_codec(agent_format)
+
+        self.mold_renderer = self.ctx.program(
+            vertex_shader='''
+                #version 330
+            ''' + codec + self.DEPOSIT_HEADER + '''
+                uniform float width;
+                uniform float height;
+
+                in AGENT in_agent;
+
+                void main() {
+                    vec3 in_vert = decode_agent(in_agent);
+
+                    // Aim at the center of the agent's cell so rasterization
+                    // agrees with truncating the position like the compute backend
+                    vec2 cell = floor(in_vert.xy) + 0.5;
+                    gl_Position = vec4(cell.x * 2 / width - 1, cell.y * 2 / height - 1, 0.0, 1.0);
+            ''' + self.DEPOSIT_SETUP + '''
+                }
+            ''',
+            fragment_shader=self.DEPOSIT_FRAGMENT,
+        )
+
+        self.mold_renderer['width'] = self.width
+        self.mold_renderer['height'] = self.height
+
+        self.mold_prog = self.ctx.program(
+            vertex_shader='''
+                #version 330
+            ''' + codec + self.MOLD_HEADER + MOLD_SHADER,
+            varyings=self.VARYINGS,
+        )
+
+        trail = []
+        for _ in range(2):
+            texture = self.ctx.texture((self.width, self.height), self.components, pixels.tobytes(), dtype=trail_dtype)
+            texture.filter = moderngl.NEAREST, moderngl.NEAREST
+            if self.components == 1:
+                texture.swizzle = 'RRR1'
+            trail.append((texture, self.ctx.framebuffer(color_attachments=[texture])))
+        self.trail = PingPong(*trail)
+
+        self.diffusion = DiffusionStage(self.ctx, size, radius=diffuse_radius, kernel=diffuse_kernel, dtype=trail_dtype,
+                                        components=self.components)
+        self.diffusion.profiler = self.profiler
+
+        self._set_parameters()
+        self.deposit_amount = deposit_amount
+
+        if agent_format != 'f4':
+            self.mold_prog['agent_bounds'] = self.bounds
+            self.mold_renderer['agent_bounds'] = self.bounds
+
+        # Each side keeps the vertex arrays that read from its buffer, so
+        # swapping sides never rebinds anything
+        mold_vbo1 = self.ctx.buffer(self._spawn_agents(spawn, seed))
+        mold_vbo2 = self.ctx.buffer(reserve=mold_vbo1.size)
+        self.agents = PingPong(*[
+            (
+                vbo,
+                self.ctx.vertex_array(self.mold_prog, [(vbo, *self._agent_layout())]),
+                self.ctx.vertex_array(self.mold_renderer, [(vbo, *self._agent_layout())]),
+            )
+            for vbo in (mold_vbo1, mold_vbo2)
+        ])
+
+    def _set_parameters(self):
+        '''
+        sets the movement parameters of the agents
+        '''
+        self.mold_prog['speed'] = 1.0
+        self.mold_prog['turn_speed'] = 0.25
+        self.mold_prog['sensor_angle_spacing'] = 0.4
+        self.mold_prog['sensor_offset_dist'] = 3.0
+
+    def _spawn_agents(self, spawn, seed):
+        '''
+        returns the initial agents in the layout of _agent_layout()
+        '''
+        return pack_agents(spawn_agents(self.num_agents, self.bounds, spawn, seed), self.agent_format, self.bounds)
+
+    def _agent_layout(self):
+        '''
+        returns the vertex format and attributes of one agent
+        '''
+        return AGENT_FORMATS[self.agent_format][1], 'in_agent'
+
+    def step(self, n=1):
+        '''
+        advances the simulation by n fixed steps
+        '''
+        for _ in range(n):
+            self._step()
+
+    @property
+    def texture(self):
+        '''
+        returns the texture holding the current trail map
+        '''
+        return self.trail.front[0]
+
+    @property
+    def deposit_amount(self):
+        '''
+        how much trail each agent adds to its cell per step
+        '''
+        return self.mold_renderer['deposit_amount'].value
+
+    @deposit_amount.setter
+    def deposit_amount(self, value):
+        self.mold_renderer['deposit_amount'] = value
+
+    def _step(self):
+        self.ctx.enable_only(moderngl.NOTHING)
+
+        # Surfaceless contexts have no default framebuffer, and transforms
+        # still need a complete one bound
+        self.trail.front[1].use()
+
+        # Bind texture to channel 0
+        self.texture.use(location=0)
+
+        vbo, mold_transform_vao, mold_renderer_vao = self.agents.front
+        with scope(self.profiler, 'agents'):
+            mold_transform_vao.transform(self.agents.back[0])
+
+        # Deposit straight into the trail map, or where the diffusion wants
+        # it for half float trails, agents on the same cell add up
+        self.ctx.enable_only(moderngl.BLEND)
+        self.ctx.blend_func = moderngl.ADDITIVE_BLENDING
+        with scope(self.profiler, 'deposit'):
+            if self.diffusion.deposit is not None:
+                self.diffusion.deposit.use()
+                self.diffusion.deposit.clear()
+            mold_renderer_vao.render(moderngl.POINTS)
+        self.ctx.enable_only(moderngl.NOTHING)
+
+        self.agents.swap()
+
+        self.diffusion.apply(self.trail)
+
+        self.steps += 1
+
+        if self.leak_check is not None:
+            self.leak_check.frame()
+
+        if self.profiler is not None:
+            self.profiler.frame()
+
+    def read_trail(self, out=None):
+        '''
+        returns the trail map as a (height, width) float32 array, read
+        into out when it is given
+        '''
+        texel = (self.trail_dtype, self.components) if self.components > 1 else self.trail_dtype
+        if self.trail_dtype == 'f4':
+            return read_texture(self.texture, texel, out)
+        trail = read_texture(self.texture, texel)
+        if out is None:
+            return trail.astype('f4')
+        out[...] = trail
+        return out
+
+    def read_agents(self, out=None):
+        '''
+        returns the agents as a (num_agents, 3) float32 array of x, y, angle,
+        read into out when it is given
+        '''
+        if self.agent_format == 'f4':
+            return read_buffer(self.agents.front[0], ('f4', 3), self.num_agents, out)
+        data = read_buffer(self.agents.front[0], 'u4', self.num_agents * AGENT_FORMATS[self.agent_format][2] // 4)
+        agents = unpack_agents(data, self.agent_format, self.bounds)
+        if out is None:
+            return agents
+        out[:self.num_agents] = agents
+        return out[:self.num_agents]
+
+
+def create_sim(size=(120, 120), num_agents=100, ctx=None, backend='auto', **kwargs):
+    '''
+    returns a simulation on the requested backend. 'auto' picks the compute
+    shader backend when the context supports GL 4.3, the transform feedback
+    one otherwise, and the NumPy one when no context can be created at all.
+    'multiprocess' spreads the NumPy backend over worker processes. All of
+    them have the same API. Only the transform feedback backend has compact
+    trail_dtype and agent_format options and several species, given as
+    species like for SpeciesPhysarumSim, so 'auto' picks it for them.
+    '''
+    trail_dtype = kwargs.pop('trail_dtype', 'f4')
+    agent_format = kwargs.pop('agent_format', 'f4')
+    species = kwargs.pop('species', None)
+    compact = trail_dtype != 'f4' or agent_format != 'f4'
+    if compact and backend not in ('auto', 'transform'):
+        raise ValueError(f'the {backend} backend only stores trails and agents as f4')
+    if species is not None and backend not in ('auto', 'transform'):
+        raise ValueError(f'the {backend} backend only has one species')
+    transform_only = compact or species is not None
+
+    if backend == 'cpu':
+        from physarum_cpu import CpuPhysarumSim
+        return CpuPhysarumSim(size, num_agents, **kwargs)
+    if backend == 'multiprocess':
+        from physarum_mp import MultiprocessPhysarumSim
+        return MultiprocessPhysarumSim(size, num_agents, **kwargs)
+
+    if ctx is None:
+        try:
+            ctx = moderngl.create_standalone_context()
+        except Exception:
+            if backend != 'auto' or transform_only:
+                raise
+            return create_sim(size, num_agents, backend='cpu', **kwargs)
+
+    if backend == 'auto':
+        backend = 'compute' if ctx.version_code >= 430 and not transform_only else 'transform'
+
+    if backend == 'compute':
+        from physarum_compute import ComputePhysarumSim
+        return ComputePhysarumSim(size, num_agents, ctx=ctx, **kwargs)
+    if backend == 'transform' and species is not None:
+        from physarum_species import SpeciesPhysarumSim
+        return SpeciesPhysarumSim(size, num_agents, ctx=ctx, species=species, trail_dtype=trail_dtype,
+                                  agent_format=agent_format, **kwargs)
+    if backend == 'transform':
+        return PhysarumSim(size, num_agents, ctx=ctx, trail_dtype=trail_dtype, agent_format=agent_format, **kwargs)
+    raise ValueError(f'unknown backend {backend!r}')
+
+
+class TrailView:
+    '''
+    Draws the trail map of any sim over the whole bound framebuffer, at
+    whatever size it has. The NumPy sims have no context or texture, so
+    for them ctx must be passed, and their trail is uploaded each draw.
+    '''
+
+    def __init__(self, sim, ctx=None):
+        self.sim = sim
+        self.ctx = ctx or sim.ctx
+
+        self.prog = self.ctx.program(
+            vertex_shader='''
+                #version 330
+
+                in vec2 in_vert;
+                in vec2 in_texcoord;
+
+                out vec2 v_text;
+
+                void main() {
+                    v_text = in_texcoord;
+                    gl_Position = vec4(in_vert, 0.0, 1.0);
+                }
+            ''',
+            fragment_shader='''
+                #version 330
+
+                // Will read from texture bound to channel / locaton 0 by default
+                uniform sampler2D Texture;
+
+                // Interpolated texture coordinate from vertex shader
+                in vec2 v_text;
+                // The fragment ending up on the screen
+                out vec4 f_color;
+
+                void main() {
+                    f_color = texture(Texture, v_text);
+                }
+            ''',
+        )
+
+        self.vbo = self.ctx.buffer(np.array([
+            # x    y     u  v
+            -1.0, -1.0,  0, 0,  # lower left
+            -1.0,  1.0,  0, 1,  # upper left
+            1.0,  -1.0,  1, 0,  # lower right
+            1.0,   1.0,  1, 1,  # upper right
+        ], dtype="f4"))
+        self.vao = self.ctx.simple_vertex_array(self.prog, self.vbo, 'in_vert', 'in_texcoord')
+
+        self.upload = None
+        if getattr(sim, 'texture', None) is None:
+            self.upload = self.ctx.texture((sim.width, sim.height), 1, dtype='f4')
+            self.upload.filter = moderngl.NEAREST, moderngl.NEAREST
+            self.upload.swizzle = 'RRR1'
+
+    def step(self, n=1):
+        self.sim.step(n)
+
+    def draw(self):
+        '''
+        renders the current trail into the bound framebuffer
+        '''
+        if self.upload is None:
+            self.sim.texture.use(location=0)
+        else:
+            self.upload.write(self.sim.read_trail())
+            self.upload.use(location=0)
+        self.vao.render(moderngl.TRIANGLE_STRIP)
+
+
+if __name__ == '__main__':
+    import time
+
+    sim = create_sim()
+    start = time.perf_counter()
+    sim.step(1000)
+    trail = sim.read_trail()
+    elapsed = time.perf_counter() - start
+    print(f'{sim.backend} backend')
+    print(f'{sim.steps} steps in {elapsed:.3f}s ({sim.steps / elapsed:.0f} steps/s)')
+    print(f'trail sum {trail.sum():.3f}, max {trail.max():.3f}')
@@ -0,0 +1,228 @@
+import moderngl
+import numpy as np
+
+from agent import spawn_agents
+from diffusion import ComputeDiffusionStage
+from profiler import PassProfiler, scope
+from readback import read_buffer, read_texture
+from resources import LeakCheck, PingPong
+
+
+class ComputePhysarumSim:
+    '''
+    PhysarumSim on GL 4.3 compute shaders. Agents live in a storage buffer
+    and are updated in place, each one counting itself into an r32ui
+    deposit image with imageAtomicAdd, so there is no vertex pipeline and
+    no point rendering involved. The counts are folded into the trail by
+    the diffusion passes. Has the same API as PhysarumSim.
+    '''
+
+    backend = 'compute'
+
+    AGENT_LOCAL_SIZE = 256
+
+    def __init__(self, size=(120, 120), num_agents=100, ctx=None, leak_check=False,
+                 diffuse_radius=1, diffuse_kernel='box', deposit_amount=1.0, spawn='center-facing', seed=None,
+                 profile=False):
+        if ctx is None:
+            ctx = moderngl.create_standalone_context(require=430)
+        self.ctx = ctx
+
+        self.leak_check = LeakCheck(ctx) if leak_check else None
+        self.profiler = PassProfiler(ctx) if profile else None
+
+        self.width, self.height = size
+        self.num_agents = num_agents
+        self.steps = 0
+
+        pixels = np.zeros((self.height, self.width)).astype('f4')
+
+        self.mold_prog = self.ctx.compute_shader(f'''
+            #version 430
+
+            layout(local_size_x = {self.AGENT_LOCAL_SIZE}) in;
+
+            // Same x, y, angle layout as the transform feedback agents
+            layout(std430, binding = 0) buffer Agents {{
+                float agents[];
+            }};
+
+            layout(r32ui, binding = 0) uniform uimage2D Deposit;
+
+            uniform sampler2D Texture;
+
+            uniform int num_agents;
+            uniform float speed;
+            uniform float turn_speed;
+            uniform float sensor_angle_spacing;
+            uniform float sensor_offset_dist;
+
+            uniform float pi = 3.14159265;
+
+            vec2 in_pos;
+            float in_angle;
+
+            float cell(int x, int y) {{
+                ivec2 tSize = textureSize(Texture, 0).xy;
+                return texelFetch(Texture, ivec2((x + tSize.x) % tSize.x, (y + tSize.y) % tSize.y), 0).r;
+            }}
+
+            float random() {{
+                int width = textureSize(Texture, 0).x;
+                uint state = uint(in_pos.y * width + in_pos.x);
+                state ^= 2747636419u;
+                state *= 2654435769u;
+                state ^= state >> 16;
+                state *= 2654435769u;
+                state ^= state >> 16;
+                state *= 2654435769u;
+                return float(state) / 4294967295.0;
+            }}
+
+            float sense(float angleOffset) {{
+                float angle = in_angle + angleOffset;
+                vec2 senseDir = vec2(cos(angle), sin(angle));
+                vec2 sensePos = in_pos + senseDir * sensor_offset_dist;
+
+                float sum = 0.0;
+                for (int i = -1; i <= 1; i++) {{
+                    for (int j = -1; j <= 1; j++) {{
+                        vec2 pos = sensePos + vec2(i, j);
+                        sum += cell(int(pos.x), int(pos.y));
+                    }}
+                }}
+
+                return sum;
+            }}
+
+            void main() {{
+                // Dispatches wider than the work group limit wrap into y
+                uint id = gl_GlobalInvocationID.y * gl_NumWorkGroups.x * gl_WorkGroupSize.x + gl_GlobalInvocationID.x;
+                if (id >= uint(num_agents)) return;
+
+                in_pos = vec2(agents[id * 3], agents[id * 3 + 1]);
+                in_angle = agents[id * 3 + 2];
+
+                imageAtomicAdd(Deposit, ivec2(in_pos), 1u);
+
+                vec2 vel = speed * vec2(cos(in_angle), sin(in_angle));
+                vec2 out_pos = in_pos + vel;
+                float out_angle;
+
+                ivec2 tSize = textureSize(Texture, 0).xy;
+
+                float forward = sense(0);
+                float left = sense(-sensor_angle_spacing);
+                float right = sense(sensor_angle_spacing);
+
+                if (forward > left && forward > right) {{
+                    out_angle = in_angle;
+                }} else if (forward < left && forward < right) {{
+                    out_angle = in_angle + (random() - 0.5) * 2 * turn_speed;
+                }} else if (right > left) {{
+                    out_angle = in_angle + turn_speed;
+                }} else if (right < left) {{
+                    out_angle = in_angle - turn_speed;
+                }} else {{
+                    out_angle = in_angle;
+                }}
+
+                if (out_pos.x < 0 || out_pos.x >= tSize.x || out_pos.y < 0 || out_pos.y >= tSize.y) {{
+                    float x = min(tSize.x - 0.01, max(0, out_pos.x));
+                    float y = min(tSize.y - 0.01, max(0, out_pos.y));
+                    out_pos = vec2(x, y);
+                    out_angle = random() * 2 * pi;
+                }}
+
+                agents[id * 3] = out_pos.x;
+                agents[id * 3 + 1] = out_pos.y;
+                agents[id * 3 + 2] = out_angle;
+            }}
+        ''')
+
+        trail = []
+        for _ in range(2):
+            texture = self.ctx.texture((self.width, self.height), 1, pixels.tobytes(), dtype='f4')
+            texture.filter = moderngl.NEAREST, moderngl.NEAREST
+            texture.swizzle = 'RRR1'
+            trail.append((texture, self.ctx.framebuffer(color_attachments=[texture])))
+        self.trail = PingPong(*trail)
+
+        self.deposit = self.ctx.texture((self.width, self.height), 1, np.zeros_like(pixels, dtype='u4').tobytes(), dtype='u4')
+        self.deposit.filter = moderngl.NEAREST, moderngl.NEAREST
+
+        self.diffusion = ComputeDiffusionStage(self.ctx, size, radius=diffuse_radius, kernel=diffuse_kernel)
+        self.diffusion.deposit_amount = deposit_amount
+        self.diffusion.profiler = self.profiler
+
+        self.mold_prog['num_agents'] = self.num_agents
+        self.mold_prog['speed'] = 1.0
+        self.mold_prog['turn_speed'] = 0.25
+        self.mold_prog['sensor_angle_spacing'] = 0.4
+        self.mold_prog['sensor_offset_dist'] = 3.0
+
+        self.agents = self.ctx.buffer(spawn_agents(self.num_agents, (0, 0, self.width, self.height), spawn, seed))
+
+        groups = (self.num_agents + self.AGENT_LOCAL_SIZE - 1) // self.AGENT_LOCAL_SIZE
+        max_groups = self.ctx.info['GL_MAX_COMPUTE_WORK_GROUP_COUNT'][0]
+        self.agent_groups = (min(groups, max_groups), (groups + max_groups - 1) // max_groups)
+
+    def step(self, n=1):
+        '''
+        advances the simulation by n fixed steps
+        '''
+        for _ in range(n):
+            self._step()
+
+    @property
+    def texture(self):
+        '''
+        returns the texture holding the current trail map
+        '''
+        return self.trail.front[0]
+
+    @property
+    def deposit_amount(self):
+        '''
+        how much trail each agent adds to its cell per step
+        '''
+        return self.diffusion.deposit_amount
+
+    @deposit_amount.setter
+    def deposit_amount(self, value):
+        self.diffusion.deposit_amount = value
+
+    def _step(self):
+        self.texture.use(location=0)
+        self.agents.bind_to_storage_buffer(0)
+        self.deposit.bind_to_image(0, read=True, write=True)
+        with scope(self.profiler, 'agents'):
+            self.mold_prog.run(*self.agent_groups)
+            self.ctx.memory_barrier(moderngl.SHADER_IMAGE_ACCESS_BARRIER_BIT | moderngl.SHADER_STORAGE_BARRIER_BIT)
+
+        self.diffusion.apply(self.trail, self.deposit)
+
+        # Later passes sample the trail as a texture, and captures read it back
+        self.ctx.memory_barrier(moderngl.TEXTURE_FETCH_BARRIER_BIT | moderngl.TEXTURE_UPDATE_BARRIER_BIT)
+
+        self.steps += 1
+
+        if self.leak_check is not None:
+            self.leak_check.frame()
+
+        if self.profiler is not None:
+            self.profiler.frame()
+
+    def read_trail(self, out=None):
+        '''
+        returns the trail map as a (height, width) float32 array, read
+        into out when it is given
+        '''
+        return read_texture(self.texture, 'f4', out)
+
+    def read_agents(self, out=None):
+        '''
+        returns the agents as a (num_agents, 3) float32 array of x, y, angle,
+        read into out when it is given
+        '''
+        return read_buffer(self.agents, ('f4', 3), self.num_agents, out)
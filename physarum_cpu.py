@@ -0,0 +1,242 @@
+import numpy as np
+
+from agent import AGENT_DTYPE, spawn_agents
+from diffusion import kernel_weights
+
+
+def hash_random(x, y, width):
+    '''
+    returns the shaders' position hash in [0, 1] for arrays of x and y
+    '''
+    state = (y * np.float32(width) + x).astype(np.uint32)
+    state ^= np.uint32(2747636419)
+    state *= np.uint32(2654435769)
+    state ^= state >> 16
+    state *= np.uint32(2654435769)
+    state ^= state >> 16
+    state *= np.uint32(2654435769)
+    return state.astype('f4') / np.float32(4294967295.0)
+
+
+def box_sum(trail):
+    '''
+    returns the sum of the 3x3 neighbourhood of every cell, wrapping at the
+    edges
+    '''
+    rows = trail + np.roll(trail, 1, axis=0) + np.roll(trail, -1, axis=0)
+    return rows + np.roll(rows, 1, axis=1) + np.roll(rows, -1, axis=1)
+
+
+def sense(trail, box, x, y):
+    '''
+    returns the 3x3 trail sum around each sensor position like the shaders'
+    sense(), truncating the sample positions towards zero
+    '''
+    height, width = trail.shape
+    index = y.astype(np.int32) % height * width + x.astype(np.int32) % width
+    result = np.take(box.ravel(), index)
+
+    # Within one cell of zero, truncating x - 1 and x + 1 does not give three
+    # neighbouring cells, so those few sensors are sampled tap by tap
+    odd = (np.abs(x) < 1) | (np.abs(y) < 1)
+    if odd.any():
+        taps = np.arange(-1, 2, dtype='f4')
+        ix = (x[odd, None] + taps).astype(np.int32) % width
+        iy = (y[odd, None] + taps).astype(np.int32) % height
+        result[odd] = trail[iy[:, :, None], ix[:, None, :]].sum(axis=(1, 2))
+
+    return result
+
+
+def move_agents(agents, trail, speed, turn_speed, sensor_angle_spacing, sensor_offset_dist, box=None):
+    '''
+    returns the agents after one sense, rotate and move step on trail.
+    box is box_sum(trail), computed here unless it is passed in.
+    '''
+    height, width = trail.shape
+    x, y, angle = agents['x'], agents['y'], agents['angle']
+
+    if box is None:
+        box = box_sum(trail)
+
+    def sense_at(offset):
+        sense_angle = angle + np.float32(offset)
+        return sense(
+            trail, box,
+            x + np.cos(sense_angle) * np.float32(sensor_offset_dist),
+            y + np.sin(sense_angle) * np.float32(sensor_offset_dist),
+        )
+
+    forward = sense_at(0)
+    left = sense_at(-sensor_angle_spacing)
+    right = sense_at(sensor_angle_spacing)
+
+    random = hash_random(x, y, width)
+    turn_speed = np.float32(turn_speed)
+
+    out_angle = np.select(
+        [
+            (forward > left) & (forward > right),
+            (forward < left) & (forward < right),
+            right > left,
+            right < left,
+        ],
+        [
+            angle,
+            angle + (random - np.float32(0.5)) * 2 * turn_speed,
+            angle + turn_speed,
+            angle - turn_speed,
+        ],
+        angle,
+    )
+
+    moved = np.empty_like(agents)
+    moved['x'] = x + np.float32(speed) * np.cos(angle)
+    moved['y'] = y + np.float32(speed) * np.sin(angle)
+    moved['angle'] = out_angle
+
+    outside = (moved['x'] < 0) | (moved['x'] >= width) | (moved['y'] < 0) | (moved['y'] >= height)
+    moved['x'][outside] = np.clip(moved['x'][outside], 0, np.float32(width - 0.01))
+    moved['y'][outside] = np.clip(moved['y'][outside], 0, np.float32(height - 0.01))
+    moved['angle'][outside] = random[outside] * 2 * np.float32(np.pi)
+
+    return moved
+
+
+def deposit(trail, agents, amount):
+    '''
+    adds amount to trail on the cell of every agent, in place
+    '''
+    index = agents['y'].astype(np.int32) * trail.shape[1] + agents['x'].astype(np.int32)
+    np.add.at(trail.ravel(), index, np.float32(amount))
+
+
+def diffuse(trail, weights, diffuse_rate, decay_rate):
+    '''
+    returns trail blurred with the separable kernel weights (center tap
+    first), mixed with the original by diffuse_rate and decayed
+    '''
+    blurred = trail
+    for axis in (1, 0):
+        result = weights[0] * blurred
+        for k in range(1, len(weights)):
+            result += weights[k] * (np.roll(blurred, k, axis=axis) + np.roll(blurred, -k, axis=axis))
+        blurred = result
+
+    diffuse_rate = np.float32(diffuse_rate)
+    diffused = trail * (1 - diffuse_rate) + blurred * diffuse_rate
+    return np.maximum(0, diffused - np.float32(decay_rate))
+
+
+def check_cpu_options(leak_check, profile):
+    '''
+    raises a ValueError for the PhysarumSim options that need a GPU
+    '''
+    if leak_check:
+        raise ValueError('the NumPy backends have no moderngl objects to leak check')
+    if profile:
+        raise ValueError('the NumPy backends have no GPU passes to profile')
+
+
+def copy_out(array, out=None):
+    '''
+    returns a copy of array, or copies it into the first len(array) rows of
+    out and returns those
+    '''
+    if out is None:
+        return array.copy()
+    out[:len(array)] = array
+    return out[:len(array)]
+
+
+class CpuPhysarumSim:
+    '''
+    PhysarumSim in vectorized NumPy, for machines without a GPU and as a
+    reference to check the shaders against. Has the same API as PhysarumSim
+    apart from the texture, and follows the same step: agents sense the
+    trail and move, deposit where they were, then the trail is diffused.
+
+    ctx is only taken so every backend is created the same way, and is not
+    used. There are no GPU objects to check or passes to time, so setting
+    leak_check or profile raises a ValueError and self.profiler is None.
+    '''
+
+    backend = 'cpu'
+
+    def __init__(self, size=(120, 120), num_agents=100, ctx=None, leak_check=False,
+                 diffuse_radius=1, diffuse_kernel='box', deposit_amount=1.0, spawn='center-facing', seed=None,
+                 profile=False):
+        check_cpu_options(leak_check, profile)
+        self.profiler = None
+
+        self.width, self.height = size
+        self.num_agents = num_agents
+        self.steps = 0
+
+        self.speed = 1.0
+        self.turn_speed = 0.25
+        self.sensor_angle_spacing = 0.4
+        self.sensor_offset_dist = 3.0
+        self.deposit_amount = deposit_amount
+        self.diffuse_rate = 0.2
+        self.decay_rate = 0.07
+        self.weights = kernel_weights(diffuse_radius, diffuse_kernel).astype('f4')
+
+        self.trail = np.zeros((self.height, self.width), dtype='f4')
+        self.agents = spawn_agents(self.num_agents, (0, 0, self.width, self.height), spawn, seed).view(AGENT_DTYPE)
+
+    def step(self, n=1):
+        '''
+        advances the simulation by n fixed steps
+        '''
+        for _ in range(n):
+            self._step()
+
+    def _step(self):
+        moved = move_agents(
+            self.agents, self.trail,
+            self.speed, self.turn_speed, self.sensor_angle_spacing, self.sensor_offset_dist,
+        )
+        deposit(self.trail, self.agents, self.deposit_amount)
+        self.agents = moved
+
+        self.trail = diffuse(self.trail, self.weights, self.diffuse_rate, self.decay_rate)
+
+        self.steps += 1
+
+    def read_trail(self, out=None):
+        '''
+        returns the trail map as a (height, width) float32 array, copied
+        into out when it is given
+        '''
+        return copy_out(self.trail, out)
+
+    def read_agents(self, out=None):
+        '''
+        returns the agents as a (num_agents, 3) float32 array of x, y, angle,
+        copied into out when it is given
+        '''
+        return copy_out(self.agents.view('f4').reshape(self.num_agents, 3), out)
+
+
+if __name__ == '__main__':
+    import time
+
+    from physarum import create_sim
+
+    # Run the GPU backend from the same seed and compare
+    sim = CpuPhysarumSim(seed=0)
+    reference = create_sim(seed=0)
+
+    for _ in range(10):
+        sim.step()
+        reference.step()
+        agents = np.abs(sim.read_agents() - reference.read_agents()).max()
+        trail = np.abs(sim.read_trail() - reference.read_trail()).max()
+        print(f'step {sim.steps}: max agent error {agents:.6f}, max trail error {trail:.6f}')
+
+    sim = CpuPhysarumSim((1024, 1024), 1_000_000)
+    start = time.perf_counter()
+    sim.step(10)
+    elapsed = time.perf_counter() - start
+    print(f'1M agents: {sim.steps / elapsed:.1f} steps/s')
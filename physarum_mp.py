@@ -0,0 +1,230 @@
+import multiprocessing
+import os
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from agent import AGENT_DTYPE, spawn_agents
+from diffusion import kernel_weights
+from physarum_cpu import box_sum, check_cpu_options, copy_out, deposit, diffuse, move_agents
+
+# Arrays attached by each worker process, by name
+_shared = {}
+
+
+def _attach(layout):
+    for name, (shm_name, shape, dtype) in layout.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _shared[name] = (shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf))
+
+
+def _array(name):
+    return _shared[name][1]
+
+
+def _halo_rows(array, start, stop, halo):
+    '''
+    returns rows start - halo to stop + halo of array, wrapping around
+    '''
+    return np.take(array, np.arange(start - halo, stop + halo) % len(array), axis=0)
+
+
+def _box_tile(args):
+    front, start, stop = args
+    trail = _array(f'trail{front}')
+    _array('box')[start:stop] = box_sum(_halo_rows(trail, start, stop, 1))[1:-1]
+
+
+def _agents_tile(args):
+    shard, front, start, stop, params, amount = args
+    trail = _array(f'trail{front}')
+    agents = _array('agents')[start:stop]
+
+    moved = move_agents(agents, trail, *params, box=_array('box'))
+
+    partial = _array('partials')[shard]
+    partial[:] = 0
+    deposit(partial, agents, amount)
+
+    agents[:] = moved
+
+
+def _reduce_tile(args):
+    front, start, stop = args
+    deposited = _array('deposited')
+    deposited[start:stop] = _array(f'trail{front}')[start:stop] + _array('partials')[:, start:stop].sum(axis=0)
+
+
+def _diffuse_tile(args):
+    front, start, stop, weights, diffuse_rate, decay_rate = args
+    halo = len(weights) - 1
+    rows = _halo_rows(_array('deposited'), start, stop, halo)
+    result = diffuse(rows, weights, diffuse_rate, decay_rate)
+    _array(f'trail{1 - front}')[start:stop] = result[halo:len(result) - halo]
+
+
+def _release(pool, shared):
+    pool.close()
+    pool.join()
+    for shm in shared:
+        shm.close()
+        shm.unlink()
+
+
+def _split(total, parts):
+    bounds = np.linspace(0, total, parts + 1).astype(int)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+class MultiprocessPhysarumSim:
+    '''
+    CpuPhysarumSim spread over a pool of worker processes. All state lives
+    in shared memory, so nothing but tile bounds is sent to the workers.
+    A step is four parallel phases over row tiles or agent shards:
+
+    - the 3x3 box sum of the trail that agents sense, per row tile
+    - moving the agents, each shard depositing into its own partial map
+    - adding the partial maps to the trail, per row tile
+    - diffusing, per row tile reading a halo of rows from its neighbours
+
+    Each shard deposits into a full height x width float32 partial map that
+    is zeroed and then summed into the trail every step, so partials take
+    workers x height x width x 4 bytes (4.3 GB for 64 workers on a 4K grid)
+    and the memory traffic of a step grows with the number of workers.
+
+    Call close() (or use it as a context manager) to stop the workers and
+    free the shared memory, which otherwise happens once the sim is garbage
+    collected or the interpreter exits. ctx, leak_check and profile are
+    handled like CpuPhysarumSim does.
+    '''
+
+    backend = 'multiprocess'
+
+    def __init__(self, size=(120, 120), num_agents=100, ctx=None, leak_check=False,
+                 diffuse_radius=1, diffuse_kernel='box', deposit_amount=1.0, spawn='center-facing', seed=None,
+                 profile=False, workers=None):
+        check_cpu_options(leak_check, profile)
+        self.profiler = None
+
+        self.width, self.height = size
+        self.num_agents = num_agents
+        self.workers = workers or os.cpu_count()
+        self.steps = 0
+
+        self.speed = 1.0
+        self.turn_speed = 0.25
+        self.sensor_angle_spacing = 0.4
+        self.sensor_offset_dist = 3.0
+        self.deposit_amount = deposit_amount
+        self.diffuse_rate = 0.2
+        self.decay_rate = 0.07
+        self.weights = kernel_weights(diffuse_radius, diffuse_kernel).astype('f4')
+
+        grid = (self.height, self.width)
+        self.shared = {}
+        self.arrays = {}
+        layout = {}
+        for name, shape, dtype in [
+            ('agents', (num_agents,), AGENT_DTYPE),
+            ('trail0', grid, 'f4'),
+            ('trail1', grid, 'f4'),
+            ('box', grid, 'f4'),
+            ('deposited', grid, 'f4'),
+            ('partials', (self.workers,) + grid, 'f4'),
+        ]:
+            nbytes = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+            shm = shared_memory.SharedMemory(create=True, size=nbytes)
+            self.shared[name] = shm
+            self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+            layout[name] = (shm.name, shape, dtype)
+
+        self.arrays['trail0'][:] = 0
+        self.arrays['agents'][:] = spawn_agents(num_agents, (0, 0, self.width, self.height), spawn, seed).view(AGENT_DTYPE)
+        self.front = 0
+
+        self.rows = _split(self.height, self.workers)
+        self.shards = _split(num_agents, self.workers)
+
+        self.pool = multiprocessing.Pool(self.workers, initializer=_attach, initargs=(layout,))
+        self._finalizer = weakref.finalize(self, _release, self.pool, list(self.shared.values()))
+
+    def step(self, n=1):
+        '''
+        advances the simulation by n fixed steps
+        '''
+        for _ in range(n):
+            self._step()
+
+    def _step(self):
+        front = self.front
+        params = (self.speed, self.turn_speed, self.sensor_angle_spacing, self.sensor_offset_dist)
+
+        self.pool.map(_box_tile, [(front, start, stop) for start, stop in self.rows])
+        self.pool.map(_agents_tile, [
+            (shard, front, start, stop, params, self.deposit_amount)
+            for shard, (start, stop) in enumerate(self.shards)
+        ])
+        self.pool.map(_reduce_tile, [(front, start, stop) for start, stop in self.rows])
+        self.pool.map(_diffuse_tile, [
+            (front, start, stop, self.weights, self.diffuse_rate, self.decay_rate)
+            for start, stop in self.rows
+        ])
+
+        self.front = 1 - front
+        self.steps += 1
+
+    def read_trail(self, out=None):
+        '''
+        returns the trail map as a (height, width) float32 array, copied
+        into out when it is given
+        '''
+        return copy_out(self.arrays[f'trail{self.front}'], out)
+
+    def read_agents(self, out=None):
+        '''
+        returns the agents as a (num_agents, 3) float32 array of x, y, angle,
+        copied into out when it is given
+        '''
+        return copy_out(self.arrays['agents'].view('f4').reshape(self.num_agents, 3), out)
+
+    def close(self):
+        # The arrays export the shared buffers, which then cannot be closed
+        self.arrays.clear()
+        self._finalizer()
+        self.shared.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def scaling_benchmark(size=(1024, 1024), num_agents=1_000_000, steps=10, max_workers=None):
+    '''
+    times the same simulation with 1, 2, 4, ... up to max_workers worker
+    processes and returns a list of (workers, steps per second, speedup)
+    '''
+    import time
+
+    max_workers = max_workers or os.cpu_count()
+    counts = sorted({min(2 ** i, max_workers) for i in range(max_workers.bit_length() + 1)})
+
+    results = []
+    for workers in counts:
+        with MultiprocessPhysarumSim(size, num_agents, workers=workers) as sim:
+            sim.step()
+            start = time.perf_counter()
+            sim.step(steps)
+            rate = steps / (time.perf_counter() - start)
+        results.append((workers, rate, rate / results[0][1] if results else 1.0))
+    return results
+
+
+if __name__ == '__main__':
+    import sys
+
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    for workers, rate, speedup in scaling_benchmark(max_workers=max_workers):
+        print(f'{workers:3d} workers: {rate:7.2f} steps/s, {speedup:5.2f}x')
@@ -0,0 +1,87 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from readback import read_buffer
+
+
+def pipelined(jobs, submit, collect, decode, depth=2):
+    '''
+    runs jobs with up to depth of them in flight on the GPU and yields what
+    decode returns for each, in order.
+
+    submit(slot, job) queues the GPU work of a job using the resources of
+    slot, one of range(depth). collect(slot, job) reads its results back
+    into memory it owns and is only called once the next jobs are queued,
+    so waiting on it overlaps with them. decode(job, data) then runs on a
+    worker thread while the GPU goes on. submit and collect make the GL
+    calls and stay on the calling thread.
+
+    moderngl has no fence objects, so every slot's own buffers and queries
+    act as its fence: collecting a slot only waits for that slot's work,
+    not for the jobs queued after it.
+    '''
+    in_flight = deque()
+    decoding = deque()
+
+    with ThreadPoolExecutor(1) as executor:
+        for index, job in enumerate(jobs):
+            if len(in_flight) == depth:
+                slot, done = in_flight.popleft()
+                decoding.append(executor.submit(decode, done, collect(slot, done)))
+
+            slot = index % depth
+            submit(slot, job)
+            in_flight.append((slot, job))
+
+            while decoding and decoding[0].done():
+                yield decoding.popleft().result()
+
+        while in_flight:
+            slot, done = in_flight.popleft()
+            decoding.append(executor.submit(decode, done, collect(slot, done)))
+
+        while decoding:
+            yield decoding.popleft().result()
+
+
+def capture(sim, frames, steps=1, decode=None, depth=3):
+    '''
+    advances sim by steps per frame and yields decode(frame, trail) for
+    frames frames, the trail being a float32 array shaped like what
+    sim.read_trail() returns, (height, width) or (height, width, components).
+    The trail of a GPU sim is copied into one of depth pixel buffers on the
+    GPU and only read back once the following frames are queued. decode
+    runs on a worker thread and defaults to returning the trail.
+    '''
+    if decode is None:
+        decode = lambda frame, trail: trail
+
+    if getattr(sim, 'texture', None) is None:
+        # The NumPy sims have nothing to overlap with
+        for frame in range(frames):
+            sim.step(steps)
+            yield decode(frame, sim.read_trail())
+        return
+
+    # Half float trails are read back as they are and widened on the CPU
+    dtype = sim.texture.dtype
+    components = sim.texture.components
+    texel = (dtype, components) if components > 1 else dtype
+    shape = (sim.height, sim.width, components) if components > 1 else (sim.height, sim.width)
+    size = sim.width * sim.height * components * int(dtype[1:])
+    pbos = [sim.ctx.buffer(reserve=size) for _ in range(depth)]
+
+    def submit(slot, frame):
+        sim.step(steps)
+        # The trail ping-pongs, so the front texture changes every step
+        sim.texture.read_into(pbos[slot])
+
+    def collect(slot, frame):
+        trail = read_buffer(pbos[slot], texel, sim.width * sim.height).reshape(shape)
+        return trail.astype('f4', copy=False)
+
+    try:
+        yield from pipelined(range(frames), submit, collect, decode, depth)
+    finally:
+        for pbo in pbos:
+            pbo.release()
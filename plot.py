@@ -0,0 +1,220 @@
+import moderngl
+import numpy as np
+
+from readback import read_buffer
+
+
+class Plot:
+    '''
+    Many line plots drawn with one multi-draw call. The points of every
+    series live in one vertex buffer, each series in its own region of
+    twice its capacity where every point is stored twice, capacity apart.
+    That way a series used as a ring buffer always has its latest points in
+    one contiguous run starting at its oldest point, however far the ring
+    has wrapped, so appending only uploads the new points and a full series
+    keeps its latest capacity points.
+
+    A draw command per series holds the first vertex and the count of that
+    run, so every series draws exactly its own points and a series is only
+    limited by memory. Contexts older than GL 4.3 have no multi-draw and
+    draw the series one call each instead.
+
+    capacity is the number of points kept per series, or a list with one
+    capacity per series. bounds is the (x min, y min, x max, y max) of the
+    data that maps to the bound framebuffer.
+    '''
+
+    def __init__(self, ctx, series, capacity, colors=None, bounds=(-1, -1, 1, 1)):
+        self.ctx = ctx
+        self.series = series
+        self.capacities = np.broadcast_to(np.asarray(capacity, dtype=np.int64), (series,)).copy()
+        if (self.capacities < 1).any():
+            raise ValueError('every series needs a capacity of at least one point')
+        # First vertex of the region of every series
+        self.offsets = np.concatenate([[0], np.cumsum(2 * self.capacities)[:-1]])
+
+        self.prog = self.ctx.program(
+            vertex_shader='''
+                #version 330
+
+                // x min, y min, x max, y max
+                uniform vec4 bounds;
+
+                in vec2 in_point;
+                in vec3 in_color;
+
+                out vec3 v_color;
+
+                void main() {
+                    v_color = in_color;
+                    gl_Position = vec4((in_point - bounds.xy) / (bounds.zw - bounds.xy) * 2.0 - 1.0, 0.0, 1.0);
+                }
+            ''',
+            fragment_shader='''
+                #version 330
+
+                in vec3 v_color;
+
+                out vec3 f_color;
+
+                void main() {
+                    f_color = v_color;
+                }
+            ''',
+        )
+
+        self.points = self.ctx.buffer(reserve=int(2 * self.capacities.sum()) * 8)
+
+        # Start and length of every series in its ring
+        self.ranges = np.zeros((series, 2), dtype=np.int64)
+
+        # count, instance count, first vertex, base instance of every series.
+        # The base instance picks the color of the series, and moderngl
+        # reads commands 20 bytes apart
+        self.commands = np.zeros((series, 5), dtype='u4')
+        self.commands[:, 1] = 1
+        self.commands[:, 3] = np.arange(series)
+        self.command_buffer = self.ctx.buffer(self.commands)
+        self.multi_draw = self.ctx.version_code >= 430
+        self.dirty = False
+
+        if colors is None:
+            colors = np.ones((series, 3))
+        self.color_buffer = self.ctx.buffer(np.asarray(colors, dtype='f4').reshape(series, 3))
+
+        self.vao = self.ctx.vertex_array(self.prog, [
+            (self.points, '2f', 'in_point'),
+            (self.color_buffer, '3f/i', 'in_color'),
+        ])
+
+        self.bounds = bounds
+
+    @property
+    def bounds(self):
+        return tuple(self.prog['bounds'].value)
+
+    @bounds.setter
+    def bounds(self, value):
+        self.prog['bounds'] = tuple(float(v) for v in value)
+
+    def __len__(self):
+        return self.series
+
+    def lengths(self):
+        '''
+        returns the number of points in every series
+        '''
+        return self.ranges[:, 1].copy()
+
+    def _write(self, index, head, points):
+        '''
+        writes points into the ring of series index from head on, wrapping
+        around its end, and into the copy of the ring right after it
+        '''
+        capacity = int(self.capacities[index])
+        offset = int(self.offsets[index])
+        first = min(len(points), capacity - head)
+        for start, run in ((head, points[:first]), (0, points[first:])):
+            if len(run):
+                self.points.write(run, offset=(offset + start) * 8)
+                self.points.write(run, offset=(offset + start + capacity) * 8)
+
+    @staticmethod
+    def _pack(x, y):
+        return np.ascontiguousarray(np.stack(np.broadcast_arrays(x, y), axis=-1), dtype='f4')
+
+    def set(self, index, x, y):
+        '''
+        replaces series index with the points x, y
+        '''
+        self.ranges[index] = 0
+        self.append(index, x, y)
+
+    def append(self, index, x, y):
+        '''
+        adds the points x, y to the end of series index, dropping its oldest
+        points once it is full
+        '''
+        capacity = int(self.capacities[index])
+        points = self._pack(x, y).reshape(-1, 2)[-capacity:]
+        if len(points) == 0:
+            return
+        start, length = (int(v) for v in self.ranges[index])
+        self._write(index, (start + length) % capacity, points)
+
+        length += len(points)
+        if length > capacity:
+            start = (start + length - capacity) % capacity
+            length = capacity
+        self.ranges[index] = start, length
+        self.dirty = True
+
+    def append_all(self, x, y):
+        '''
+        adds one point to every series, y holding a value per series and x
+        either one value for all of them or one per series
+        '''
+        points = self._pack(x, np.asarray(y).reshape(self.series)).reshape(self.series, 2)
+        for index in range(self.series):
+            self.append(index, points[index, 0], points[index, 1])
+
+    def fit(self, margin=0.05):
+        '''
+        sets the bounds to fit every point, read back from the buffer
+        '''
+        data = read_buffer(self.points, ('f4', 2))
+        # The series and the position in its region of every vertex
+        owner = np.repeat(np.arange(self.series), 2 * self.capacities)
+        position = np.arange(len(data)) - self.offsets[owner]
+        start, length = self.ranges[owner].T
+        used = (position >= start) & (position < start + length)
+        if not used.any():
+            return
+        low = data[used].min(axis=0)
+        high = data[used].max(axis=0)
+        pad = np.maximum((high - low) * margin, 1e-6)
+        self.bounds = (*(low - pad), *(high + pad))
+
+    def draw(self):
+        '''
+        renders every series into the bound framebuffer
+        '''
+        if self.dirty:
+            self.commands[:, 0] = self.ranges[:, 1]
+            self.commands[:, 2] = self.offsets + self.ranges[:, 0]
+            self.command_buffer.write(self.commands)
+            self.dirty = False
+
+        if self.multi_draw:
+            self.vao.render_indirect(self.command_buffer, moderngl.LINE_STRIP, count=self.series)
+            return
+
+        location = self.prog['in_color'].location
+        for index, (count, _, first, _, _) in enumerate(self.commands):
+            if count:
+                self.vao.bind(location, 'f', self.color_buffer, '3f', offset=index * 12, divisor=1)
+                self.vao.render(moderngl.LINE_STRIP, vertices=int(count), first=int(first))
+        self.vao.bind(location, 'f', self.color_buffer, '3f', divisor=1)
+
+
+if __name__ == '__main__':
+    from PIL import Image
+
+    from physarum import create_sim
+
+    # Live telemetry: the total trail and the busiest cell of a simulation
+    ctx = moderngl.create_standalone_context()
+    sim = create_sim(ctx=ctx)
+    plot = Plot(ctx, 2, 500, colors=[(1, 1, 1), (1, 0, 0)])
+
+    for step in range(500):
+        sim.step()
+        trail = sim.read_trail()
+        plot.append_all(step, [trail.sum(), trail.max() * 100])
+
+    plot.fit()
+    fbo = ctx.simple_framebuffer((800, 400))
+    fbo.use()
+    fbo.clear(0.0, 0.0, 0.0, 1.0)
+    plot.draw()
+    Image.frombytes('RGB', fbo.size, fbo.read(), 'raw', 'RGB', 0, -1).show()
@@ -1,85 +1,32 @@
 import numpy as np
 
-import struct
 import moderngl
 import moderngl_window as mglw
-
-def agent():
-    a = np.random.uniform(0.0, np.pi * 2.0)
-    return np.array([
-        np.random.uniform(-1, 1),
-        np.random.uniform(-1, 1),
-        np.random.uniform(0.0, np.pi * 2.0),
-    ]).astype('f4')
+from agent import AGENT_FORMATS, SPAWNS
+from particles import ParticleSim
+from scheduler import FixedTimestep
 
 class Particles(mglw.WindowConfig):
+    num_agents = 100
+    spawn = 'uniform'
+
+    @classmethod
+    def add_arguments(cls, parser):
+        parser.add_argument('--agents', type=int, default=cls.num_agents, help='number of particles')
+        parser.add_argument('--spawn', choices=SPAWNS, default=cls.spawn, help='where the particles start')
+        parser.add_argument('--agent-format', choices=AGENT_FORMATS, default='f4', help='how the particles are packed')
+        parser.add_argument('--sim-rate', type=float, metavar='HZ',
+                            help='simulation steps per second, independent of the display rate')
+        parser.add_argument('--steps-per-frame', type=int, default=1, metavar='N',
+                            help='simulation steps per displayed frame when no --sim-rate is given')
+        parser.add_argument('--max-steps', type=int, metavar='N',
+                            help='most steps a frame runs to catch up with --sim-rate')
+
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
 
-        self.prog = self.ctx.program(
-            vertex_shader='''
-                #version 330
-
-                in vec3 in_vert;
-
-                out float angle;
-
-                void main() {
-                    gl_Position = vec4(in_vert.x, in_vert.y, 0.0, 1.0);
-                    angle = in_vert.z;
-                }
-            ''',
-            fragment_shader='''
-                #version 330
-
-                in float angle;
-
-                out vec3 color;
-
-                void main() {
-                    color = vec3(angle, angle, angle);
-                }
-            ''',
-        )
-
-        self.transform = self.ctx.program(
-            vertex_shader='''
-            #version 330
-
-            uniform float pi = 3.14159265;
-
-            in vec2 in_pos;
-            in float in_angle;
-
-            out vec2 out_pos;
-            out float out_angle;
-
-            float random() {
-                uint state = uint(in_pos.y * 2000 + in_pos.x);
-                state ^= 2747636419u;
-                state *= 2654435769u;
-                state ^= state >> 16;
-                state *= 2654435769u;
-                state ^= state >> 16;
-                state *= 2654435769u;
-                return float(state) / 4294967295.0;
-            }
-
-            void main() {
-                vec2 vel = vec2(cos(in_angle), sin(in_angle));
-                out_pos = in_pos + vel * 0.002;
-                out_angle = in_angle;
-
-                if (out_pos.x <= -1 || out_pos.x >= 1 || out_pos.y <= -1 || out_pos.y >= 1) {
-                    float x = min(0.99, max(-0.99, out_pos.x));
-                    float y = min(0.99, max(-0.99, out_pos.y));
-                    out_pos = vec2(x, y);
-                    out_angle += pi / 2 + random() * pi;
-                }
-            }
-        ''',
-            varyings=['out_pos', 'out_angle']
-        )
+        self.sim = ParticleSim(self.argv.agents, ctx=self.ctx, spawn=self.argv.spawn, agent_format=self.argv.agent_format)
+        self.clock = FixedTimestep(self.argv.sim_rate, self.argv.steps_per_frame, self.argv.max_steps)
 
         self.display_prog = self.ctx.program(
             vertex_shader='''
@@ -127,27 +74,14 @@ class Particles(mglw.WindowConfig):
         self.texture_pbo = self.ctx.buffer(reserve=pixels.nbytes)
         self.texture_buffer = self.ctx.renderbuffer(self.window_size)
 
-        self.num_agents = 100
-
-        agents = np.array([agent() for _ in range(self.num_agents)])
-        self.agents_buffer1 = self.ctx.buffer(agents.astype('f4'))
-        self.agents_buffer2 = self.ctx.buffer(reserve=self.agents_buffer1.size)
-        self.vao = self.ctx.vertex_array(self.prog, self.agents_buffer1, 'in_vert')
-
-        self.transform_vao = self.ctx.simple_vertex_array(self.transform, self.agents_buffer1, 'in_pos', 'in_angle')
-
     def render(self, time, frame_time):
-        self.ctx.point_size = 1.0
-
         self.texture.use(location=0)
 
-        self.transform_vao.transform(self.agents_buffer2, vertices=self.num_agents * 3)
-
-        self.vao.render(mode=moderngl.POINTS)
+        self.sim.draw()
 
         #self.texture_vao.render(moderngl.TRIANGLE_STRIP)
 
-        self.ctx.copy_buffer(self.agents_buffer1, self.agents_buffer2)
+        self.sim.step(self.clock.advance(time))
 
 if __name__ == '__main__':
     Particles.run()
\ No newline at end of file
@@ -0,0 +1,121 @@
+import sys
+from collections import deque
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+SATURATED = 0xFFFFFFFF
+
+
+def scope(profiler, name):
+    '''
+    returns profiler.scope(name), or a scope that does nothing when
+    profiler is None
+    '''
+    return nullcontext() if profiler is None else profiler.scope(name)
+
+
+class PassProfiler:
+    '''
+    Times named GPU passes with query objects. Each pass is wrapped in
+    scope(name), and frame() collects the results of the scopes since the
+    last frame into rolling windows of the last window frames.
+
+    Reading a query waits for its pass to finish, so profiling stalls the
+    pipeline once per frame, but the measured times are the GPU's own.
+    Time queries cannot nest, so neither can scopes.
+
+    With console set, a summary is printed every console frames.
+    '''
+
+    def __init__(self, ctx, window=120, console=0, file=sys.stderr):
+        self.ctx = ctx
+        self.window = window
+        self.console = console
+        self.file = file
+        self.frames = 0
+
+        self.queries = {}
+        self.pending = []
+        self.elapsed = {}
+        self.primitives = {}
+
+    @contextmanager
+    def scope(self, name):
+        '''
+        times everything the block submits as the pass name
+        '''
+        if name in (pending for pending, _ in self.pending):
+            # The query is about to be reused, so its last result goes first
+            self._collect()
+        query = self.queries.get(name)
+        if query is None:
+            query = self.queries[name] = self.ctx.query(time=True, primitives=True)
+            self.elapsed[name] = deque(maxlen=self.window)
+            self.primitives[name] = deque(maxlen=self.window)
+        with query:
+            yield
+        self.pending.append((name, query))
+
+    def _collect(self):
+        for name, query in self.pending:
+            elapsed = query.elapsed
+            # moderngl reads the time as 32 bits, which saturates past ~4s
+            if elapsed != SATURATED:
+                self.elapsed[name].append(elapsed)
+                self.primitives[name].append(query.primitives)
+        self.pending.clear()
+
+    def frame(self):
+        '''
+        collects the passes of the frame that just ended
+        '''
+        self._collect()
+        self.frames += 1
+        if self.console and self.frames % self.console == 0:
+            print(self.summary(), file=self.file)
+
+    def stats(self, name):
+        '''
+        returns the mean, median, 90th and 99th percentile and max GPU time
+        of a pass in milliseconds over the window, with its primitive count
+        '''
+        elapsed = np.array(self.elapsed[name]) / 1e6
+        if len(elapsed) == 0:
+            return None
+        p50, p90, p99 = np.percentile(elapsed, (50, 90, 99))
+        return {
+            'samples': len(elapsed),
+            'mean': float(elapsed.mean()),
+            'p50': float(p50),
+            'p90': float(p90),
+            'p99': float(p99),
+            'max': float(elapsed.max()),
+            'primitives': self.primitives[name][-1],
+        }
+
+    def report(self):
+        '''
+        returns the stats of every pass by name
+        '''
+        return {name: self.stats(name) for name in self.elapsed if self.elapsed[name]}
+
+    def slowest(self):
+        '''
+        returns the name of the pass with the highest median, or None
+        '''
+        report = self.report()
+        return max(report, key=lambda name: report[name]['p50']) if report else None
+
+    def summary(self):
+        '''
+        returns the report as a table, slowest pass first
+        '''
+        report = self.report()
+        lines = [f'{"pass":<20} {"p50 ms":>8} {"p90 ms":>8} {"p99 ms":>8} {"max ms":>8} {"prims":>9}']
+        for name, stats in sorted(report.items(), key=lambda item: -item[1]['p50']):
+            lines.append(
+                f'{name:<20} {stats["p50"]:8.3f} {stats["p90"]:8.3f} {stats["p99"]:8.3f} '
+                f'{stats["max"]:8.3f} {stats["primitives"]:9d}'
+            )
+        return '\n'.join(lines)
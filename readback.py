@@ -0,0 +1,37 @@
+import numpy as np
+
+
+def read_buffer(buffer, dtype, count=None, out=None, offset=0):
+    '''
+    returns count records of dtype from buffer, all that fit by default,
+    read straight into out or into a new array without going through bytes.
+    dtype is usually structured to match the captured varyings, so the
+    result can be used field by field.
+    '''
+    dtype = np.dtype(dtype)
+    if count is None:
+        count = (buffer.size - offset) // dtype.itemsize
+    if out is None:
+        out = np.empty((count,) + dtype.shape, dtype=dtype.base)
+    elif out.dtype != dtype.base or out.shape[1:] != dtype.shape or len(out) < count or not out.flags.c_contiguous:
+        raise ValueError(f'out must be a contiguous array of at least {count} {dtype} records')
+    buffer.read_into(out, size=count * dtype.itemsize, offset=offset)
+    return out[:count]
+
+def read_texture(texture, dtype='f4', out=None):
+    '''
+    returns a (height, width) array of texels read straight into out or into
+    a new array. dtype must cover one texel, like 'f4' for a single channel
+    float texture or ('f4', 4) for an RGBA one.
+    '''
+    dtype = np.dtype(dtype)
+    # moderngl dtypes end in the channel size, 'f1' being normalized bytes
+    if dtype.itemsize != texture.components * int(texture.dtype[1:]):
+        raise ValueError(f'{dtype} does not match the texels of a {texture.components} x {texture.dtype} texture')
+    shape = (texture.height, texture.width) + dtype.shape
+    if out is None:
+        out = np.empty(shape, dtype=dtype.base)
+    elif out.shape != shape or out.dtype != dtype.base or not out.flags.c_contiguous:
+        raise ValueError(f'out must be a contiguous {shape} {dtype.base} array')
+    texture.read_into(out)
+    return out
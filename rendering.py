@@ -3,49 +3,19 @@ import numpy as np
 
 from PIL import Image
 
-ctx = moderngl.create_standalone_context()
-
-prog = ctx.program(
-    vertex_shader='''
-        #version 330
-
-        in vec2 in_vert;
-        in vec3 in_color;
-
-        out vec3 v_color;
-
-        void main() {
-            v_color = in_color;
-            gl_Position = vec4(in_vert, 0.0, 1.0);
-        }
-    ''',
-    fragment_shader='''
-        #version 330
+from plot import Plot
 
-        in vec3 v_color;
-
-        out vec3 f_color;
-
-        void main() {
-            f_color = v_color;
-        }
-    ''',
-)
+ctx = moderngl.create_standalone_context()
 
 x = np.linspace(-1.0, 1.0, 50)
 y = np.random.rand(50) - 0.5
-r = np.ones(50)
-g = np.zeros(50)
-b = np.zeros(50)
-
-vertices = np.dstack([x, y, r, g, b])
 
-vbo = ctx.buffer(vertices.astype('f4').tobytes())
-vao = ctx.simple_vertex_array(prog, vbo, 'in_vert', 'in_color')
+plot = Plot(ctx, 1, 50, colors=[(1.0, 0.0, 0.0)])
+plot.set(0, x, y)
 
 fbo = ctx.simple_framebuffer((512, 512))
 fbo.use()
 fbo.clear(0.0, 0.0, 0.0, 1.0)
-vao.render(moderngl.LINE_STRIP)
+plot.draw()
 
-Image.frombytes('RGB', fbo.size, fbo.read(), 'raw', 'RGB', 0, -1).show()
\ No newline at end of file
+Image.frombytes('RGB', fbo.size, fbo.read(), 'raw', 'RGB', 0, -1).show()
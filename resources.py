@@ -0,0 +1,74 @@
+import moderngl
+
+
+class LeakCheck:
+    '''
+    Counts the moderngl objects created through a context that have not been
+    released yet. Call frame() once per step: after the first (warm up)
+    frame the count must stay flat, otherwise a step is leaking.
+    '''
+
+    FACTORIES = (
+        'buffer', 'texture', 'texture_array', 'texture3d', 'texture_cube',
+        'depth_texture', 'renderbuffer', 'depth_renderbuffer', 'framebuffer',
+        'simple_framebuffer', 'program', 'compute_shader', 'vertex_array',
+        'simple_vertex_array', 'query', 'sampler',
+    )
+
+    def __init__(self, ctx):
+        self.ctx = ctx
+        self.objects = {}
+        self.frames = 0
+        self.last = None
+
+        for name in self.FACTORIES:
+            setattr(ctx, name, self._wrap(getattr(ctx, name)))
+
+    def _wrap(self, factory):
+        def tracked(*args, **kwargs):
+            obj = factory(*args, **kwargs)
+            # simple_vertex_array and friends delegate, so dedupe by identity
+            self.objects[id(obj)] = obj
+            return obj
+        return tracked
+
+    @property
+    def live(self):
+        '''
+        returns the number of tracked objects that are still allocated
+        '''
+        self.objects = {
+            key: obj for key, obj in self.objects.items()
+            if not isinstance(getattr(obj, 'mglo', None), moderngl.InvalidObject)
+        }
+        return len(self.objects)
+
+    def frame(self):
+        '''
+        records the live object count for this frame and raises if it has
+        grown since the previous one
+        '''
+        live = self.live
+        if self.last is not None and live > self.last:
+            raise RuntimeError(
+                f'leaked {live - self.last} moderngl objects in frame {self.frames}'
+            )
+        self.frames += 1
+        self.last = live
+        return live
+
+
+class PingPong:
+    '''
+    Holds two copies of some state. Passes read from front and write into
+    back, then swap() flips their roles, so the result never has to be
+    copied back. Each side can be a tuple of objects that belong together,
+    like a buffer and the vertex arrays reading from it.
+    '''
+
+    def __init__(self, front, back):
+        self.front = front
+        self.back = back
+
+    def swap(self):
+        self.front, self.back = self.back, self.front
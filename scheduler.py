@@ -0,0 +1,49 @@
+import math
+
+
+class FixedTimestep:
+    '''
+    Decides how many simulation steps each displayed frame runs, so the
+    simulation speed no longer depends on the refresh rate.
+
+    Without a rate, every frame runs steps_per_frame steps. With a rate,
+    the simulation runs at rate steps per second of the time passed to
+    advance(), catching up after slow frames with up to max_steps steps
+    per frame. Time beyond that is dropped rather than owed, so a frame
+    that is too slow to keep up slows the simulation down instead of
+    making every later frame slower too. self.dropped counts the steps
+    that were dropped this way.
+    '''
+
+    def __init__(self, rate=None, steps_per_frame=1, max_steps=None):
+        self.rate = rate
+        self.steps_per_frame = steps_per_frame
+        if max_steps is None:
+            # A quarter of a second of catching up at most
+            max_steps = max(1, math.ceil(rate / 4)) if rate else steps_per_frame
+        self.max_steps = max_steps
+
+        self.update_delay = 1 / rate if rate else None  # seconds per step
+        self.last_updated = None
+        self.steps = 0
+        self.dropped = 0
+
+    def advance(self, time):
+        '''
+        returns the number of steps to run for a frame shown at time seconds
+        '''
+        if self.rate is None:
+            steps = self.steps_per_frame
+        elif self.last_updated is None:
+            self.last_updated = time
+            steps = 0
+        else:
+            steps = int((time - self.last_updated) / self.update_delay)
+            if steps > self.max_steps:
+                self.dropped += steps - self.max_steps
+                steps = self.max_steps
+                self.last_updated = time
+            else:
+                self.last_updated += steps * self.update_delay
+        self.steps += steps
+        return steps
@@ -0,0 +1,40 @@
+import math
+
+import numpy as np
+import pytest
+
+from agent import AGENT_FORMATS, pack_agents, spawn_agents, unpack_agents
+
+BOUNDS = (-8.0, 4.0, 120.0, 68.0)
+
+
+@pytest.mark.parametrize('agent_format', AGENT_FORMATS)
+def test_pack_round_trip_stays_within_half_a_step(agent_format):
+    agents = spawn_agents(1000, BOUNDS, 'uniform', 0).reshape(-1, 3)
+    unpacked = unpack_agents(pack_agents(agents, agent_format, BOUNDS), agent_format, BOUNDS)
+    _, _, _, pos_bits, angle_bits = AGENT_FORMATS[agent_format]
+    if agent_format == 'f4':
+        assert np.array_equal(unpacked, agents)
+        return
+
+    lo, hi = np.array(BOUNDS[:2]), np.array(BOUNDS[2:])
+    position_step = (hi - lo) / (2 ** pos_bits - 1)
+    assert (np.abs(unpacked[:, :2] - agents[:, :2]) <= position_step / 2 * 1.001).all()
+
+    turn = np.abs(np.angle(np.exp(1j * (unpacked[:, 2] - agents[:, 2]))))
+    assert (turn <= math.pi / 2 ** angle_bits * 1.001).all()
+
+
+@pytest.mark.parametrize('agent_format', ['u16', 'u12'])
+def test_pack_clamps_to_the_bounds(agent_format):
+    agents = np.array([[-100.0, -100.0, 0.0], [BOUNDS[0], BOUNDS[1], 0.0], [BOUNDS[2], BOUNDS[3], 0.0],
+                       [500.0, 500.0, 0.0]], dtype='f4')
+    unpacked = unpack_agents(pack_agents(agents, agent_format, BOUNDS), agent_format, BOUNDS)
+    assert np.allclose(unpacked[:, :2], [BOUNDS[:2], BOUNDS[:2], BOUNDS[2:], BOUNDS[2:]])
+
+
+@pytest.mark.parametrize('agent_format', ['u16', 'u12'])
+def test_pack_wraps_the_angle(agent_format):
+    agents = np.array([[0.0, 0.0, -math.pi / 2], [0.0, 0.0, 2 * math.pi]], dtype='f4')
+    unpacked = unpack_agents(pack_agents(agents, agent_format, BOUNDS), agent_format, BOUNDS)
+    assert np.allclose(unpacked[:, 2], [3 * math.pi / 2, 0.0], atol=1e-6)
@@ -0,0 +1,42 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from cubes import tiles
+from cubes_cpu import CpuCubeSearch
+
+
+def brute_force(targets, n):
+    targets = set(targets)
+    return [
+        (x, y, z, x ** 3 + y ** 3 + z ** 3)
+        for x, y, z in itertools.product(range(-n, n + 1), repeat=3)
+        if x ** 3 + y ** 3 + z ** 3 in targets
+    ]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_cpu_search_finds_what_brute_force_finds(workers):
+    targets = range(-30, 31)
+    with CpuCubeSearch(targets, workers=workers, batch_size=1000) as search:
+        assert search.find((-12, 12), (-12, 12), (-12, 12)) == brute_force(targets, 12)
+
+
+def test_cpu_search_of_an_empty_box_finds_nothing():
+    with CpuCubeSearch([0, 1], workers=1) as search:
+        assert search.find((1, 0), (-5, 5), (-5, 5)) == []
+
+
+@pytest.mark.parametrize('batch_size', [1, 3, 7, 20, 60, 1000])
+def test_tiles_cover_the_box_exactly_once(batch_size):
+    x_range, y_range, z_range = (-2, 3), (1, 4), (-3, 1)
+    counts = np.zeros((6, 4, 5), dtype=int)
+    for (x, y, z), (nx, ny, nz) in tiles(x_range, y_range, z_range, batch_size):
+        assert nx * ny * nz <= batch_size
+        counts[x + 2:x + 2 + nx, y - 1:y - 1 + ny, z + 3:z + 3 + nz] += 1
+    assert (counts == 1).all()
+
+
+def test_tiles_of_an_empty_range_are_empty():
+    assert list(tiles((0, -1), (0, 5), (0, 5), 10)) == []
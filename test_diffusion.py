@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from diffusion import MAX_RADIUS, kernel_weights
+
+
+@pytest.mark.parametrize('kernel', ['box', 'gaussian'])
+@pytest.mark.parametrize('radius', [0, 1, 3, MAX_RADIUS])
+def test_kernel_weights_sum_to_one(kernel, radius):
+    weights = kernel_weights(radius, kernel)
+    assert len(weights) == radius + 1
+    assert np.isclose(weights[0] + 2 * weights[1:].sum(), 1)
+
+
+def test_box_weights_are_equal():
+    assert np.allclose(kernel_weights(2), 1 / 5)
+
+
+def test_gaussian_weights_fall_off():
+    assert (np.diff(kernel_weights(4, 'gaussian')) < 0).all()
+
+
+def test_kernel_weights_reject_bad_arguments():
+    with pytest.raises(ValueError):
+        kernel_weights(MAX_RADIUS + 1)
+    with pytest.raises(ValueError):
+        kernel_weights(-1)
+    with pytest.raises(ValueError):
+        kernel_weights(1, 'triangle')
@@ -0,0 +1,30 @@
+from scheduler import FixedTimestep
+
+
+def test_without_a_rate_every_frame_runs_steps_per_frame():
+    timestep = FixedTimestep(steps_per_frame=3)
+    assert [timestep.advance(t) for t in (0.0, 0.5, 0.51)] == [3, 3, 3]
+    assert timestep.steps == 9
+
+
+def test_runs_at_rate_and_catches_up_after_a_slow_frame():
+    timestep = FixedTimestep(rate=8, max_steps=4)
+    assert timestep.advance(0.0) == 0
+    assert timestep.advance(0.125) == 1
+    # Less than a step since the last one
+    assert timestep.advance(0.2) == 0
+    assert timestep.advance(0.5) == 3
+    assert timestep.dropped == 0
+    assert timestep.steps == 4
+
+
+def test_drops_what_is_beyond_max_steps():
+    timestep = FixedTimestep(rate=8)
+    # A quarter of a second of catching up
+    assert timestep.max_steps == 2
+    timestep.advance(0.0)
+    assert timestep.advance(1.0) == 2
+    assert timestep.dropped == 6
+    # The dropped time is not owed to later frames
+    assert timestep.advance(1.125) == 1
+    assert timestep.dropped == 6
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from vector import Vector, VectorArray
+
+
+def test_mod_matches_vector():
+    vectors = [Vector(5.5, -3.0, 7.25), Vector(-1.0, 12.0, 0.5)]
+    result = VectorArray.from_vectors(vectors).mod(4, 5, 3)
+    expected = [vector.mod(4, 5, 3).array for vector in vectors]
+    assert np.allclose(result.array, expected)
+
+
+def test_mod_with_fewer_mods_truncates_like_vector():
+    vectors = [Vector(5.5, -3.0, 7.25), Vector(-1.0, 12.0, 0.5)]
+    result = VectorArray.from_vectors(vectors).mod(4, 5)
+    expected = [vector.mod(4, 5).array for vector in vectors]
+    assert result.array.shape == (2, 2)
+    assert np.allclose(result.array, expected)
+
+
+def test_mod_with_too_few_mods_for_a_vector_raises_like_vector():
+    with pytest.raises(ValueError):
+        Vector(5.5, -3.0).mod(4)
+    with pytest.raises(ValueError):
+        VectorArray([[5.5, -3.0]]).mod(4)
+
+
+def test_in_place_operators_update_the_same_vector():
+    vector = Vector(1.0, 2.0)
+    same = vector
+    vector += Vector(0.5, -1.0)
+    vector -= Vector(1.0, 1.0)
+    vector *= 4
+    assert vector is same
+    assert vector.array == [2.0, 0.0]
+    assert vector.z == 0
+
+
+def test_in_place_operators_on_3d_vectors():
+    vector = Vector(1.0, 2.0, 3.0)
+    vector += Vector(1.0, 1.0, 1.0)
+    vector *= 0.5
+    assert vector.array == [1.0, 1.5, 2.0]
+
+
+def test_in_place_operators_check_the_size():
+    vector = Vector(1.0, 2.0)
+    with pytest.raises(ValueError):
+        vector += Vector(1.0, 2.0, 3.0)
+    with pytest.raises(ValueError):
+        vector -= Vector(1.0, 2.0, 3.0)
+
+
+def test_vector_array_in_place_operators_keep_the_array():
+    vectors = VectorArray([[1.0, 2.0], [3.0, 4.0]])
+    array = vectors.array
+    vectors += Vector(1.0, 1.0)
+    vectors *= [2, 0.5]
+    assert vectors.array is array
+    assert np.allclose(vectors.array, [[4.0, 6.0], [2.0, 2.5]])
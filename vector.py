@@ -1,7 +1,8 @@
-import functools
 import math
 import random
 
+import numpy as np
+
 def random_unit_vector():
     a = random.random() * 2 * math.pi
     return Vector(math.cos(a), math.sin(a))
@@ -20,41 +21,106 @@ def random_vector_in_circle(pos, radius):
         pos.y + r * math.sin(a),
     )
 
+def random_unit_vectors(count, rng=np.random):
+    '''
+    returns a VectorArray of count random unit vectors
+    '''
+    a = rng.uniform(0, 2 * math.pi, count)
+    return VectorArray(np.stack([np.cos(a), np.sin(a)], axis=1))
+
+def random_vectors_in_range(max_x, max_y, count, rng=np.random):
+    '''
+    returns a VectorArray of count vectors uniform in [0, max_x) x [0, max_y)
+    '''
+    return VectorArray(rng.uniform(0, 1, (count, 2)) * (max_x, max_y))
+
+def random_vectors_in_circle(pos, radius, count, rng=np.random):
+    '''
+    returns a VectorArray of count vectors around pos, sampled the same way
+    as random_vector_in_circle
+    '''
+    a, r = rng.uniform(0, 1, (2, count)) * ((2 * math.pi,), (radius,))
+    return VectorArray(np.stack([pos.x + r * np.cos(a), pos.y + r * np.sin(a)], axis=1))
+
 class Vector:
     '''
-    This is a wrapper for an array such that it behaves like a vector.
+    A fixed size 2D or 3D vector. 2D vectors keep z at 0.
     Matrix transformation is not implemented.
     '''
 
+    __slots__ = ('x', 'y', 'z', 'dim')
+
     def __init__(self, *array):
-        self.array = list(array)
+        if len(array) not in (2, 3):
+            raise ValueError('only 2D and 3D vectors are supported')
+        self.dim = len(array)
+        self.x = array[0]
+        self.y = array[1]
+        self.z = array[2] if self.dim == 3 else 0
 
-    def __add__(self, vector):
+    def _check(self, vector):
+        if self.dim != vector.dim:
+            raise ValueError('vectors must be the same size')
+
+    @property
+    def array(self):
         '''
-        adds each element of vector1 to each element of array2
+        returns the elements as a list
         '''
-        if len(self.array) != len(vector.array):
-            raise Exception('vectors must be the same size')
+        return [self.x, self.y, self.z][:self.dim]
 
-        array = []
-        for i in range(len(self.array)):
-            array.append(self.array[i] + vector.array[i])
-        return Vector(*array)
+    def __iter__(self):
+        return iter(self.array)
 
-    @property
-    def x(self):
+    def __len__(self):
+        return self.dim
+
+    def __repr__(self):
+        return f'Vector({", ".join(map(repr, self.array))})'
+
+    def __add__(self, vector):
         '''
-        returns the first element of the array
+        adds each element of vector1 to each element of array2
         '''
-        return self.array[0]
+        self._check(vector)
+        if self.dim == 2:
+            return Vector(self.x + vector.x, self.y + vector.y)
+        return Vector(self.x + vector.x, self.y + vector.y, self.z + vector.z)
 
-    @property
-    def y(self):
+    def __iadd__(self, vector):
+        self._check(vector)
+        self.x += vector.x
+        self.y += vector.y
+        self.z += vector.z
+        return self
+
+    def __sub__(self, vector):
         '''
-        returns the second element of the array
+        subtracts each element of vector1 with each element in vector2
         '''
-        return self.array[1]
-    
+        self._check(vector)
+        if self.dim == 2:
+            return Vector(self.x - vector.x, self.y - vector.y)
+        return Vector(self.x - vector.x, self.y - vector.y, self.z - vector.z)
+
+    def __isub__(self, vector):
+        self._check(vector)
+        self.x -= vector.x
+        self.y -= vector.y
+        self.z -= vector.z
+        return self
+
+    def __mul__(self, scalar):
+        return self.scale(scalar)
+
+    __rmul__ = __mul__
+
+    def __imul__(self, scalar):
+        self.x *= scalar
+        self.y *= scalar
+        self.z *= scalar
+        return self
+
     @property
     def rounded(self):
         '''
@@ -67,7 +133,9 @@ class Vector:
         '''
         returns a vector that is the original vector scaled by some scalar
         '''
-        return Vector(*[element * scalar for element in self.array])
+        if self.dim == 2:
+            return Vector(self.x * scalar, self.y * scalar)
+        return Vector(self.x * scalar, self.y * scalar, self.z * scalar)
 
     def div(self, dividend):
         '''
@@ -75,19 +143,11 @@ class Vector:
         '''
         return self.scale(1 / dividend)
 
-    def __sub__(self, vector):
-        '''
-        subtracts each element of vector1 with each element in vector2
-        '''
-        return self + vector.scale(-1)
-
     def get_sq_mag(self):
         '''
         return the square of the magnitude
         '''
-        squared_array = [element**2 for element in self.array]
-        squared_array_sum = functools.reduce(lambda a, b: a + b, squared_array)
-        return squared_array_sum
+        return self.x * self.x + self.y * self.y + self.z * self.z
 
     def get_mag(self):
         '''
@@ -101,6 +161,128 @@ class Vector:
         but with a magnitude of 1.
         '''
         return self.div(self.get_mag())
-    
+
+    def mod(self, *mods):
+        return Vector(*[val % m for val, m in zip(self.array, mods)])
+
+class VectorArray:
+    '''
+    N vectors of the same size in one (N, 2) or (N, 3) NumPy array, with
+    the same API as Vector applied to all of them at once.
+    '''
+
+    def __init__(self, array):
+        self.array = np.asarray(array, dtype=float)
+        if self.array.ndim != 2 or self.array.shape[1] not in (2, 3):
+            raise ValueError('expected an (N, 2) or (N, 3) array')
+
+    @classmethod
+    def from_vectors(cls, vectors):
+        '''
+        returns a VectorArray holding a list of Vectors
+        '''
+        return cls([vector.array for vector in vectors])
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        '''
+        returns vector index as a Vector, or a slice as a VectorArray
+        '''
+        if isinstance(index, (int, np.integer)):
+            return Vector(*self.array[index].tolist())
+        return VectorArray(self.array[index])
+
+    def __repr__(self):
+        return f'VectorArray({self.array!r})'
+
+    @staticmethod
+    def _other(vectors):
+        return vectors.array if isinstance(vectors, (Vector, VectorArray)) else vectors
+
+    def __add__(self, vectors):
+        return VectorArray(self.array + self._other(vectors))
+
+    def __iadd__(self, vectors):
+        self.array += self._other(vectors)
+        return self
+
+    def __sub__(self, vectors):
+        return VectorArray(self.array - self._other(vectors))
+
+    def __isub__(self, vectors):
+        self.array -= self._other(vectors)
+        return self
+
+    def __mul__(self, scalar):
+        return self.scale(scalar)
+
+    __rmul__ = __mul__
+
+    def __imul__(self, scalar):
+        self.array *= np.reshape(scalar, (-1, 1)) if np.ndim(scalar) else scalar
+        return self
+
+    @property
+    def x(self):
+        '''
+        returns the first element of every vector
+        '''
+        return self.array[:, 0]
+
+    @property
+    def y(self):
+        '''
+        returns the second element of every vector
+        '''
+        return self.array[:, 1]
+
+    @property
+    def z(self):
+        '''
+        returns the third element of every vector, zeros for 2D vectors
+        '''
+        if self.array.shape[1] == 2:
+            return np.zeros(len(self.array))
+        return self.array[:, 2]
+
+    @property
+    def rounded(self):
+        '''
+        returns an integer array with every element rounded to the nearest
+        integer, halves to even like round()
+        '''
+        return np.rint(self.array).astype(int)
+
+    def scale(self, scalar):
+        '''
+        returns the vectors scaled by a scalar, or by one scalar per vector
+        '''
+        return VectorArray(self.array * (np.reshape(scalar, (-1, 1)) if np.ndim(scalar) else scalar))
+
+    def div(self, dividend):
+        return self.scale(1 / np.asarray(dividend, dtype=float))
+
+    def get_sq_mag(self):
+        '''
+        returns the square of the magnitude of every vector
+        '''
+        return np.einsum('ij,ij->i', self.array, self.array)
+
+    def get_mag(self):
+        '''
+        returns the magnitude of every vector
+        '''
+        return np.sqrt(self.get_sq_mag())
+
+    def normalize(self):
+        '''
+        returns the vectors scaled to a magnitude of 1
+        '''
+        return self.div(self.get_mag())
+
     def mod(self, *mods):
-        return Vector(*[val % m for val, m in zip(self.array, mods)])
\ No newline at end of file
+        # Like Vector.mod, extra dimensions are dropped when there are fewer mods
+        size = min(self.array.shape[1], len(mods))
+        return VectorArray(np.mod(self.array[:, :size], mods[:size]))